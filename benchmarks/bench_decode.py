@@ -0,0 +1,89 @@
+import glob, json, os, random, string, sys, timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import decoding
+
+
+"""
+Compare the full response.json() decode with the minimal-field decode path.
+
+Usage:
+    python benchmarks/bench_decode.py [payload_dir]
+
+payload_dir holds recorded /fulcra/pd/productId responses (*.json). Without
+recorded payloads a synthetic response of similar shape and size is used.
+"""
+
+def random_text(k):
+    return ''.join(random.choices(string.ascii_letters + ' ', k=k))
+
+
+def synthetic_payload():
+    # Same top-level layout as a real response, padded with the heavy sections
+    product = {
+        'description': random_text(80),
+        'brand': 'Utilitech',
+        'pdURL': 'pd/Utilitech-1-Outlet-Surge-Protector/5014602717',
+        'reviewCount': 59,
+        'rating': 4.8,
+        'modelId': 'LA-7A-21',
+        'itemNumber': '615221',
+        'omniItemId': '5014602717',
+        'imageUrl': 'https://mobileimages.lowes.com/productimages/63789141.jpg',
+        'itemInventory': {'totalQty': 12, 'locations': [{'store': str(i), 'qty': i} for i in range(40)]},
+        'specifications': [{'key': random_text(20), 'value': random_text(40)} for _ in range(60)],
+        'badges': [{'name': random_text(12), 'style': random_text(20)} for _ in range(15)],
+    }
+    return {
+        'product': product,
+        'fulfillment': {'options': [{'type': random_text(10), 'message': random_text(120), 'dates': [random_text(10) for _ in range(5)]} for _ in range(30)]},
+        'recommendations': [{'omniItemId': str(random.randint(10**9, 10**10)), 'description': random_text(80), 'price': random.random() * 100} for _ in range(80)],
+        'promotions': [{'id': random_text(16), 'text': random_text(200)} for _ in range(20)],
+    }
+
+
+def load_payloads(payload_dir):
+    payloads = []
+    for path in sorted(glob.glob(os.path.join(payload_dir, '*.json'))):
+        with open(path, 'rb') as f:
+            payloads.append(f.read())
+    return payloads
+
+
+def main():
+    payload_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'payloads')
+    payloads = load_payloads(payload_dir)
+    source = f'{len(payloads)} recorded payloads from {payload_dir}'
+    if not payloads:
+        random.seed(1)
+        payloads = [json.dumps(synthetic_payload()).encode('utf-8') for _ in range(20)]
+        source = '20 synthetic payloads'
+
+    size = sum(len(p) for p in payloads) / len(payloads)
+    print(f"{source}, average {size / 1024:.1f} KiB")
+
+    # The baseline must agree with every fast path on the fields format_data reads
+    for body in payloads:
+        expected = decoding._extract(json.loads(body))
+        assert decoding.decode_product_response(body) == expected, 'fast decode differs from json decode'
+
+    candidates = [('json.loads (current path)', lambda body: json.loads(body)),
+                  ('json.loads + extract', lambda body: decoding._extract(json.loads(body)))]
+    if decoding.orjson is not None:
+        candidates.append(('orjson + extract', lambda body: decoding._extract(decoding.orjson.loads(body))))
+    if decoding.simdjson is not None:
+        candidates.append(('simdjson lazy extract', decoding._decode_simdjson))
+
+    number = 200
+    baseline = None
+    for name, decode in candidates:
+        seconds = min(timeit.repeat(lambda: [decode(body) for body in payloads], number=number, repeat=3))
+        per_call = seconds / (number * len(payloads)) * 1e6
+        baseline = baseline or per_call
+        print(f"{name:28s} {per_call:8.1f} us/response  {baseline / per_call:5.1f}x")
+
+    print(f"active backend: {decoding.BACKEND}")
+
+
+if __name__ == '__main__':
+    main()
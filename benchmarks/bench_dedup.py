@@ -0,0 +1,96 @@
+import argparse, csv, json, os, random, resource, shutil, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sinks import CSV_HEADERS
+
+
+"""
+Utils.deduplicate_csv on a synthetic result file with duplicated (omsid, storeID) pairs.
+Every implementation runs in its own process so peak RSS is its own.
+"""
+
+KEY = ['omsid', 'storeID']
+
+
+def synthetic_file(path, rows, duplicate_rate, seed=1):
+    """Result-shaped CSV where about duplicate_rate of the rows repeat an earlier pair"""
+    rnd = random.Random(seed)
+    unique = int(rows * (1 - duplicate_rate))
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADERS)
+        for index in range(rows):
+            pair = index if index < unique else rnd.randrange(unique)
+            omsid, store_id = 1000000 + pair // 1700, 1000 + pair % 1700
+            writer.writerow([
+                f'Product {omsid}', 'Brand', f'https://www.lowes.com/pd/{omsid}', f'https://mobileimages.lowes.com/{omsid}.jpg',
+                omsid, rnd.randint(0, 500), 4.5, f'M{omsid}', 'Lowes', omsid, omsid,
+                f"Store {store_id} Lowe's", store_id, f'{store_id} Main St, City, ST 12345', rnd.randint(0, 40),
+            ])
+    return unique
+
+
+def run_pandas(path):
+    import pandas as pd
+    df = pd.read_csv(path)
+    df = df.drop_duplicates(subset=KEY, keep='last')
+    df.to_csv(path, index=False)
+
+
+def run_child(implementation, path, max_keys):
+    started = time.monotonic()
+    if implementation == 'pandas':
+        run_pandas(path)
+    else:
+        from utils import Utils
+        Utils.deduplicate_csv(path, subset=KEY, max_keys=max_keys)
+    wall = time.monotonic() - started
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        rows = sum(1 for _ in csv.reader(f)) - 1
+    print(json.dumps({
+        'wall_seconds': round(wall, 2),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'rows_after': rows,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Utils.deduplicate_csv on a synthetic result file')
+    parser.add_argument('--rows', type=int, default=3000000)
+    parser.add_argument('--duplicate-rate', type=float, default=0.1)
+    parser.add_argument('--max-keys', type=int, default=2000000, help='Keys indexed in memory before spilling to disk')
+    parser.add_argument('--pandas', action='store_true', help='Also run the previous pandas drop_duplicates version')
+    parser.add_argument('--child', nargs=2, metavar=('IMPLEMENTATION', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1], args.max_keys)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix='lowes-dedup-')
+    try:
+        source = os.path.join(work_dir, 'source.csv')
+        started = time.monotonic()
+        unique = synthetic_file(source, args.rows, args.duplicate_rate)
+        print(f"{args.rows:,} rows, {unique:,} unique pairs, {os.path.getsize(source) / 1e6:.0f} MB "
+              f"(generated in {time.monotonic() - started:.1f}s)")
+
+        for implementation in ['streaming'] + (['pandas'] if args.pandas else []):
+            path = os.path.join(work_dir, f'{implementation}.csv')
+            shutil.copyfile(source, path)
+            output = subprocess.check_output(
+                [sys.executable, os.path.abspath(__file__), '--max-keys', str(args.max_keys), '--child', implementation, path],
+                text=True
+            )
+            result = json.loads(output.strip().splitlines()[-1])
+            status = 'ok' if result['rows_after'] == unique else f"expected {unique:,} rows"
+            print(f"  {implementation:<10} {result['wall_seconds']:>7}s  peak rss {result['peak_rss_mb']:>7} MB  "
+                  f"{result['rows_after']:,} rows ({status})")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+import argparse, asyncio, csv, json, os, resource, shutil, socket, subprocess, sys, tempfile, time, urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from lowes import LOWES
+from metrics import Metrics
+from controller import AdaptiveController
+import main as pipeline
+
+
+"""
+End-to-end throughput benchmark: runs main_async against the local mock server.
+
+Usage:
+    python benchmarks/bench_pipeline.py --products 50 --stores 40 --latency-median 0.05 --error-429 0.01
+
+Reports requests/s, p50/p99 latency, CPU time and peak RSS, and appends the
+result with the current commit to benchmarks/results.jsonl so runs can be
+compared across commits.
+"""
+
+RESULTS_FILE = os.path.join(ROOT, 'benchmarks', 'results.jsonl')
+
+
+class RecordingMetrics(Metrics):
+    """Keeps raw product latencies so percentiles are exact rather than bucketed"""
+
+    def __init__(self):
+        super().__init__()
+        self.raw_latencies = []
+
+    def observe_request(self, endpoint, status, latency):
+        super().observe_request(endpoint, status, latency)
+        if endpoint == 'product':
+            self.raw_latencies.append(latency)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_inputs(work_dir, num_products, num_stores):
+    """Copy the first N products and M stores of the real inputs into work_dir"""
+    products_file = 'bench_products.csv'
+    with open(os.path.join(ROOT, 'Lowes Products 2025 12 09.csv'), 'r', encoding='utf-8') as src, \
+            open(os.path.join(work_dir, products_file), 'w', encoding='utf-8', newline='') as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst)
+        writer.writerow(next(reader))
+        for index, row in enumerate(reader):
+            if index >= num_products:
+                break
+            writer.writerow(row)
+
+    with open(os.path.join(ROOT, 'store_ids.json'), 'r', encoding='utf-8') as f:
+        stores = json.load(f)['data'][:num_stores]
+    with open(os.path.join(work_dir, 'store_ids.json'), 'w', encoding='utf-8') as f:
+        json.dump({'data': stores}, f)
+    return products_file
+
+
+def output_size(results_folder):
+    """Bytes of result files, the progress journal and lock files are not counted"""
+    total = 0
+    for folder, _, files in os.walk(results_folder):
+        for name in files:
+            if name.endswith(('.csv', '.parquet')):
+                total += os.path.getsize(os.path.join(folder, name))
+    return total
+
+
+def check_parquet_store_ids(results_folder):
+    """Read the parquet output back and check store IDs survive as strings, e.g. '0004' not 4"""
+    import pyarrow.parquet as pq
+    with open(os.path.join(os.path.dirname(results_folder), 'store_ids.json'), 'r', encoding='utf-8') as f:
+        expected = {str(store['store_id']) for store in json.load(f)['data']}
+    read = set(pq.read_table(os.path.join(results_folder, 'parquet'), columns=['store_id']).column('store_id').to_pylist())
+    if read != expected:
+        raise RuntimeError(f'Parquet store IDs do not read back: {sorted(read ^ expected)[:5]}')
+
+
+def wait_for_server(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('Mock server did not start')
+
+
+def run(args):
+    port = free_port()
+    server_args = [
+        '--port', str(port), '--latency-median', str(args.latency_median), '--latency-sigma', str(args.latency_sigma),
+        '--error-401', str(args.error_401), '--error-429', str(args.error_429), '--error-503', str(args.error_503),
+        '--drop-rate', str(args.drop_rate), '--not-found-rate', str(args.not_found_rate), '--seed', '1',
+    ]
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'benchmarks', 'mock_server.py'), *server_args])
+    work_dir = tempfile.mkdtemp(prefix='lowes-bench-')
+    try:
+        wait_for_server(port)
+        products_file = prepare_inputs(work_dir, args.products, args.stores)
+
+        lowes = LOWES(proxies='')
+        lowes.root_dir = work_dir
+        lowes.api_base = f'http://127.0.0.1:{port}'
+        lowes.metrics = RecordingMetrics()
+        lowes.controller = AdaptiveController(concurrency=args.concurrency, max_concurrency=args.max_concurrency,
+                                              rate=args.rate, max_rate=args.max_rate)
+
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        started = time.monotonic()
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                asyncio.run(pipeline.main_async(output_format=args.format, lowes=lowes, products_file=products_file, summary_interval=0))
+            finally:
+                sys.stdout = stdout
+        wall = time.monotonic() - started
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+        output_bytes = output_size(os.path.join(work_dir, 'results'))
+        if args.format == 'parquet':
+            check_parquet_store_ids(os.path.join(work_dir, 'results'))
+
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/stats') as response:
+            server_counts = json.load(response)
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    metrics = lowes.metrics
+    requests = metrics.requests.get(endpoint='product')
+    cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {k: v for k, v in vars(args).items() if k != 'no_save'},
+        'jobs': args.products * args.stores,
+        'requests': requests,
+        'wall_seconds': round(wall, 3),
+        'requests_per_second': round(requests / wall, 1),
+        'p50_ms': round(percentile(metrics.raw_latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(metrics.raw_latencies, 99) * 1000, 1),
+        'cpu_seconds': round(cpu, 3),
+        'cpu_ms_per_request': round(cpu / max(requests, 1) * 1000, 3),
+        'peak_rss_mb': round(usage_after.ru_maxrss / 1024, 1),
+        'output_bytes': output_bytes,
+        'results': {dict(key)['outcome']: value for key, value in metrics.results.values.items()},
+        'server': server_counts,
+    }
+
+
+def previous_result(config, defaults):
+    """Last saved run with the same settings; options added since it ran count at their default"""
+    if not os.path.exists(RESULTS_FILE):
+        return None
+    previous = None
+    with open(RESULTS_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            entry = json.loads(line)
+            if {**defaults, **entry.get('config', {})} == config:
+                previous = entry
+    return previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end pipeline benchmark against the mock server')
+    parser.add_argument('--products', type=int, default=50)
+    parser.add_argument('--stores', type=int, default=40)
+    parser.add_argument('--latency-median', type=float, default=0.05)
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--error-401', type=float, default=0.0)
+    parser.add_argument('--error-429', type=float, default=0.0)
+    parser.add_argument('--error-503', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--not-found-rate', type=float, default=0.0)
+    parser.add_argument('--concurrency', type=int, default=50, help='Initial controller concurrency')
+    parser.add_argument('--max-concurrency', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=200.0, help='Initial controller rate (req/s)')
+    parser.add_argument('--max-rate', type=float, default=2000.0)
+    parser.add_argument('--format', choices=['csv', 'parquet', 'normalized'], default='csv', help='Output format of the run')
+    parser.add_argument('--no-save', action='store_true', help=f'Do not append to {os.path.relpath(RESULTS_FILE, ROOT)}')
+    args = parser.parse_args()
+
+    result = run(args)
+    defaults = {k: v for k, v in vars(parser.parse_args([])).items() if k != 'no_save'}
+    previous = previous_result(result['config'], defaults)
+
+    print(f"commit {result['commit']}: {result['requests']} requests for {result['jobs']} jobs in {result['wall_seconds']}s")
+    print(f"  {result['requests_per_second']} req/s, p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms")
+    print(f"  cpu {result['cpu_seconds']}s ({result['cpu_ms_per_request']} ms/request), peak rss {result['peak_rss_mb']} MB, output {result['output_bytes']:,} bytes")
+    print(f"  results {result['results']}, server {result['server']}")
+    if previous:
+        change = (result['requests_per_second'] / previous['requests_per_second'] - 1) * 100 if previous['requests_per_second'] else 0
+        cpu_change = (result['cpu_ms_per_request'] / previous['cpu_ms_per_request'] - 1) * 100 if previous['cpu_ms_per_request'] else 0
+        print(f"  vs {previous['commit']}: {change:+.1f}% req/s, {cpu_change:+.1f}% cpu/request")
+
+    if not args.no_save:
+        with open(RESULTS_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
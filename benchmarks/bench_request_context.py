@@ -0,0 +1,47 @@
+import sys, os, timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from urllib.parse import quote
+from yarl import URL
+from lowes import LOWES, Store, PRODUCT_PARAMS
+
+
+"""
+Per-request CPU of building the product request URL and the store output fields,
+rebuilding them from the Store every call vs reusing the compiled StoreContext.
+aiohttp turns a str URL + params dict into URL(url).extend_query(params), which is what the old path paid.
+"""
+
+API_BASE = 'https://apis.lowes.com'
+
+
+def rebuilt(store, sku):
+    params = {key: store.store_id if key == 'storeNumber' else value for key, value in PRODUCT_PARAMS}
+    url = URL(f'{API_BASE}/fulcra/pd/productId/{sku}').extend_query(params)
+    location = f"{store.address}, {store.city}, {store.state} {store.zipcode}"
+    return url, store.store_name, store.store_id, location
+
+
+def compiled(context, sku):
+    url = URL(f'{API_BASE}/fulcra/pd/productId/{quote(str(sku), safe="")}?{context.query}', encoded=True)
+    return url, context.store_name, context.store_id, context.store_location
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    lowes = LOWES(proxies='')
+    store = Store('2346', "Federal Way Lowe's", '35425 ENCHANTED PARKWAY SOUTH', 'Federal Way', 'WA', '98003')
+    context = lowes.store_context(store)
+    assert str(rebuilt(store, '5001234567')[0]) == str(compiled(context, '5001234567')[0]), 'compiled URL differs'
+
+    results = {}
+    for name, call in [('rebuilt', lambda: rebuilt(store, '5001234567')), ('compiled', lambda: compiled(context, '5001234567'))]:
+        results[name] = min(timeit.repeat(call, number=number, repeat=5)) / number * 1e6
+        print(f"{name:<10} {results[name]:.2f} us/request")
+    print(f"saving     {results['rebuilt'] - results['compiled']:.2f} us/request ({results['rebuilt'] / results['compiled']:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
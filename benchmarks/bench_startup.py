@@ -0,0 +1,93 @@
+import argparse, os, statistics, subprocess, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+"""
+Startup profile of the scraper's import graph using python -X importtime.
+Each sample is a fresh interpreter, so the numbers are cold-start import costs.
+Exits non-zero when the import exceeds --budget-ms or pulls in a forbidden module,
+so it can gate cron/shard deployments.
+"""
+
+# Heavy packages only loaded on the code paths that need them
+FORBIDDEN = ['pandas', 'numpy', 'requests', 'pyarrow']
+
+
+def import_profile(module):
+    """[(name, self_us, cumulative_us, depth)] for one cold import of module"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), int(self_us), int(cumulative_us), depth))
+
+    # Children are printed before their parent: keep the module and what it imported, not interpreter startup
+    end = max(i for i, entry in enumerate(entries) if entry[0] == module and entry[3] == 0)
+    start = end
+    while start > 0 and entries[start - 1][3] > 0:
+        start -= 1
+    return entries[start:end + 1]
+
+
+def wall_ms(code, samples):
+    times = []
+    for _ in range(samples):
+        result = subprocess.run(
+            [sys.executable, '-c', f'import time; t = time.perf_counter(); {code}; print(time.perf_counter() - t)'],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        times.append(float(result.stdout.strip()) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile the import graph and enforce a cold-start budget')
+    parser.add_argument('--module', default='main', help='Module to import')
+    parser.add_argument('--samples', type=int, default=5, help='Fresh interpreters to sample')
+    parser.add_argument('--top', type=int, default=15, help='Modules to list')
+    parser.add_argument('--budget-ms', type=float, default=500, help='Fail when importing the module takes longer (median)')
+    parser.add_argument('--forbid', default=','.join(FORBIDDEN), help='Comma separated modules that must not be imported at startup')
+    args = parser.parse_args()
+
+    entries = import_profile(args.module)
+    imported = {name for name, _, _, _ in entries}
+    by_self = sorted(entries, key=lambda entry: entry[1], reverse=True)[:args.top]
+    # Top-level packages under the module, by cumulative cost
+    roots = {}
+    for name, _, cumulative_us, _ in entries:
+        root = name.split('.')[0]
+        roots[root] = max(roots.get(root, 0), cumulative_us)
+    by_package = sorted(roots.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    print(f"{len(entries)} modules imported by `import {args.module}`")
+    print("\nSlowest packages (cumulative):")
+    for name, cumulative_us in by_package:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+    print("\nSlowest modules (self):")
+    for name, self_us, _, _ in by_self:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+    import_ms = wall_ms(f'import {args.module}', args.samples)
+    print(f"\nCold import of {args.module}: {import_ms:.0f} ms median of {args.samples} (budget {args.budget_ms:.0f} ms)")
+
+    failures = []
+    if import_ms > args.budget_ms:
+        failures.append(f'import took {import_ms:.0f} ms, budget is {args.budget_ms:.0f} ms')
+    forbidden = sorted(module for module in filter(None, args.forbid.split(',')) if module in imported)
+    if forbidden:
+        failures.append(f'heavy modules imported at startup: {", ".join(forbidden)}')
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
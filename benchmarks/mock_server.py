@@ -0,0 +1,132 @@
+import argparse, asyncio, glob, json, os, random, sys, uuid, zlib
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_decode import synthetic_payload
+
+
+"""
+Local stand-in for the Lowe's token and product detail endpoints.
+
+Usage:
+    python benchmarks/mock_server.py --port 8089 --latency-median 0.15 --error-429 0.02
+
+Serves recorded payloads from --payload-dir (*.json) or synthetic ones, with
+lognormal latency and injected 401/429/503 responses and dropped connections.
+"""
+
+class MockLowes():
+    def __init__(self, latency_median=0.1, latency_sigma=0.5, error_401=0.0, error_429=0.0, error_503=0.0,
+                 drop_rate=0.0, not_found_rate=0.0, payload_dir=None, seed=None):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_401 = error_401
+        self.error_429 = error_429
+        self.error_503 = error_503
+        self.drop_rate = drop_rate
+        self.not_found_rate = not_found_rate
+        self.random = random.Random(seed)
+        self.tokens = set()
+        self.counts = {}
+
+        self.payloads = []
+        if payload_dir:
+            for path in sorted(glob.glob(os.path.join(payload_dir, '*.json'))):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.payloads.append(json.load(f))
+        if not self.payloads:
+            random.seed(seed)
+            self.payloads = [synthetic_payload() for _ in range(10)]
+
+    def _count(self, key):
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    async def _latency(self):
+        if self.latency_median > 0:
+            await asyncio.sleep(self.random.lognormvariate(0, self.latency_sigma) * self.latency_median)
+
+    async def token(self, request):
+        await request.post()
+        await self._latency()
+        token = uuid.uuid4().hex
+        self.tokens.add(token)
+        self._count('token')
+        return web.json_response({'access_token': token, 'token_type': 'bearer', 'expires_in': 899})
+
+    async def product(self, request):
+        await self._latency()
+        sku = request.match_info['sku']
+        roll = self.random.random()
+
+        if roll < self.drop_rate:
+            # Abort the connection without a response
+            self._count('drop')
+            request.transport.close()
+            raise web.HTTPInternalServerError()
+        roll -= self.drop_rate
+
+        token = request.headers.get('authorization', '').replace('Bearer ', '')
+        if token not in self.tokens or roll < self.error_401:
+            # Injected 401s revoke the token like an expiry would
+            self.tokens.discard(token)
+            self._count(401)
+            return web.json_response({'message': 'Unauthorized'}, status=401)
+        roll -= self.error_401
+
+        if roll < self.error_429:
+            self._count(429)
+            return web.json_response({'message': 'Too Many Requests'}, status=429)
+        roll -= self.error_429
+
+        if roll < self.error_503:
+            self._count(503)
+            return web.Response(text='Service Unavailable', status=503)
+        roll -= self.error_503
+
+        if roll < self.not_found_rate:
+            self._count('not_found')
+            return web.json_response({'errors': [{'message': f'Product not found: {sku}'}]})
+
+        payload = self.payloads[zlib.crc32(sku.encode()) % len(self.payloads)]
+        payload = dict(payload, product=dict(payload['product'], omniItemId=sku,
+                                             itemInventory={'totalQty': self.random.randint(0, 50)}))
+        self._count(200)
+        return web.json_response(payload)
+
+    async def stats(self, request):
+        return web.json_response({str(k): v for k, v in self.counts.items()})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/v1/oauthprovider/oauth2/token', self.token)
+        app.router.add_get('/fulcra/pd/productId/{sku}', self.product)
+        app.router.add_get('/stats', self.stats)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Lowe's API server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-median', type=float, default=0.1, help='Median response latency in seconds')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='Lognormal sigma of the latency')
+    parser.add_argument('--error-401', type=float, default=0.0, help='Share of product requests answered with 401')
+    parser.add_argument('--error-429', type=float, default=0.0, help='Share answered with 429')
+    parser.add_argument('--error-503', type=float, default=0.0, help='Share answered with 503')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='Share of connections dropped without a response')
+    parser.add_argument('--not-found-rate', type=float, default=0.0, help='Share answered with a product-not-found error')
+    parser.add_argument('--payload-dir', help='Directory of recorded product responses (*.json)')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    mock = MockLowes(
+        latency_median=args.latency_median, latency_sigma=args.latency_sigma,
+        error_401=args.error_401, error_429=args.error_429, error_503=args.error_503,
+        drop_rate=args.drop_rate, not_found_rate=args.not_found_rate,
+        payload_dir=args.payload_dir, seed=args.seed,
+    )
+    web.run_app(mock.app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+import argparse, csv, heapq, json, operator, os, tempfile
+from collections import Counter
+from volatility import result_files, history_rows
+
+
+"""
+Run-to-run change feed.
+Both result CSVs are sorted on (omsid, storeID) in bounded chunks spilled to disk,
+then walked together in one merge join that emits added, removed and changed pairs.
+"""
+
+KEY = operator.itemgetter(0, 1)
+CHANGE_FORMATS = ('jsonl', 'parquet')
+
+
+def _rows(path):
+    """(omsid, store_id, qty) from a wide or normalized result CSV"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        omsid_index = header.index('omsid')
+        store_index = header.index('storeID')
+        qty_index = header.index('inventory') if 'inventory' in header else header.index('qty')
+        for row in reader:
+            yield row[omsid_index], row[store_index], row[qty_index]
+
+
+def _spill(chunk, tmp_dir):
+    chunk.sort(key=KEY)
+    fd, path = tempfile.mkstemp(suffix='.csv', dir=tmp_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerows(chunk)
+    return path
+
+
+def _read_run(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.reader(f):
+            yield tuple(row)
+
+
+def _last_per_key(rows):
+    # Rows arrive sorted and stable, so the last one of a key is the latest in the file
+    previous = None
+    for row in rows:
+        if previous is not None and KEY(row) != KEY(previous):
+            yield previous
+        previous = row
+    if previous is not None:
+        yield previous
+
+
+def sorted_rows(path, tmp_dir, chunk_rows=200000):
+    """Rows of a result CSV sorted by (omsid, storeID), one per key, holding at most chunk_rows in memory"""
+    runs = []
+    chunk = []
+    for row in _rows(path):
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            runs.append(_spill(chunk, tmp_dir))
+            chunk = []
+
+    if not runs:
+        # Small files never touch the disk
+        chunk.sort(key=KEY)
+        yield from _last_per_key(chunk)
+        return
+    if chunk:
+        runs.append(_spill(chunk, tmp_dir))
+    yield from _last_per_key(heapq.merge(*[_read_run(run) for run in runs], key=KEY))
+
+
+def _qty(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _change(kind, old, new):
+    old_qty = _qty(old[2]) if old else None
+    new_qty = _qty(new[2]) if new else None
+    row = new or old
+
+    # Stock transitions between runs; a removed pair is unknown rather than out of stock
+    stock = None
+    if new is not None:
+        if (new_qty or 0) > 0 and (old_qty or 0) <= 0:
+            stock = 'in'
+        elif old is not None and (new_qty or 0) <= 0 and (old_qty or 0) > 0:
+            stock = 'out'
+    return {'change': kind, 'omsid': row[0], 'store_id': row[1], 'old_qty': old_qty, 'new_qty': new_qty, 'stock': stock}
+
+
+def diff_rows(old_rows, new_rows, removals=True):
+    """Merge join of two key-sorted row streams"""
+    old = next(old_rows, None)
+    new = next(new_rows, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and KEY(old) < KEY(new)):
+            if removals:
+                yield _change('removed', old, None)
+            old = next(old_rows, None)
+        elif old is None or KEY(new) < KEY(old):
+            yield _change('added', None, new)
+            new = next(new_rows, None)
+        else:
+            if old[2] != new[2]:
+                yield _change('changed', old, new)
+            old = next(old_rows, None)
+            new = next(new_rows, None)
+
+
+def _write_jsonl(changes, path, counts):
+    with open(path, 'w', encoding='utf-8') as f:
+        for change in changes:
+            counts[change['change']] += 1
+            if change['stock']:
+                counts[f"stock_{change['stock']}"] += 1
+            f.write(json.dumps(change, separators=(',', ':')) + '\n')
+
+
+def _write_parquet(changes, path, counts, batch_rows=100000):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('pyarrow is required for parquet output (pip install pyarrow)')
+
+    schema = pa.schema([
+        ('change', pa.string()), ('omsid', pa.string()), ('store_id', pa.string()),
+        ('old_qty', pa.int64()), ('new_qty', pa.int64()), ('stock', pa.string()),
+    ])
+    with pq.ParquetWriter(path, schema, compression='zstd', use_dictionary=['change', 'stock']) as writer:
+        batch = []
+        for change in changes:
+            counts[change['change']] += 1
+            if change['stock']:
+                counts[f"stock_{change['stock']}"] += 1
+            batch.append(change)
+            if len(batch) >= batch_rows:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+
+def write_change_feed(old_path, new_path, output_path, change_format='jsonl', removals=True, chunk_rows=200000, old_rows=None):
+    """
+    Diff two result CSVs into a JSONL or Parquet change feed, returns counts per change type.
+    old_rows, a key-sorted (omsid, store_id, qty) stream, replaces old_path when given.
+    """
+    if change_format not in CHANGE_FORMATS:
+        raise ValueError(f'Unknown change feed format {change_format}, expected one of {CHANGE_FORMATS}')
+
+    counts = Counter()
+    tmp_output = output_path + '.tmp'
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as tmp_dir:
+        if old_rows is None:
+            old_rows = sorted_rows(old_path, tmp_dir, chunk_rows)
+        changes = diff_rows(iter(old_rows), sorted_rows(new_path, tmp_dir, chunk_rows), removals=removals)
+        if change_format == 'parquet':
+            _write_parquet(changes, tmp_output, counts)
+        else:
+            _write_jsonl(changes, tmp_output, counts)
+    os.replace(tmp_output, output_path)
+    return dict(counts)
+
+
+def diff_runs(results_folder, run_date, change_format='jsonl', removals=True, history=None):
+    """
+    Change feed of the run_date output against the latest earlier run, written to changes-<date>.<format>.
+    Incremental runs pass their volatility database as history: pairs they skipped are missing from
+    the previous output too, so each pair is compared with its last scanned quantity instead.
+    """
+    candidates = [os.path.join(results_folder, f'{prefix}-{run_date}.csv') for prefix in ('product', 'inventory')]
+    current = next((path for path in candidates if os.path.exists(path)), None)
+    previous = result_files(results_folder, run_date)
+    if current is None or not previous:
+        print(f"No CSV output to compare for {run_date}, change feed skipped")
+        return None
+
+    output_path = os.path.join(results_folder, f'changes-{run_date}.{change_format}')
+    if history is not None:
+        previous_label = 'last scans'
+        counts = write_change_feed(None, current, output_path, change_format, removals=removals, old_rows=history_rows(history, run_date))
+    else:
+        previous_label, previous_path = previous[-1]
+        counts = write_change_feed(previous_path, current, output_path, change_format, removals=removals)
+    print(f"Change feed {previous_label} -> {run_date}: {counts or 'no changes'} written to {output_path}")
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Diff two result CSVs into a change feed')
+    parser.add_argument('old', help='Earlier product-<date>.csv or inventory-<date>.csv')
+    parser.add_argument('new', help='Later result CSV')
+    parser.add_argument('output', help='Change feed file to write')
+    parser.add_argument('--format', choices=CHANGE_FORMATS, default='jsonl')
+    parser.add_argument('--no-removals', action='store_true', help='Leave out pairs missing from the new file')
+    parser.add_argument('--chunk-rows', type=int, default=200000, help='Rows sorted in memory at a time')
+    args = parser.parse_args()
+
+    counts = write_change_feed(args.old, args.new, args.output, args.format, removals=not args.no_removals, chunk_rows=args.chunk_rows)
+    print(counts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import sqlite3, time
+
+
+"""
+Persistent progress journal for the product x store matrix
+"""
+
+# Outcomes that don't need another request on resume
+DONE_OUTCOMES = ('ok', 'not_found')
+
+
+class ProgressJournal():
+    def __init__(self, db_path, batch_size=500, flush_interval=2.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.last_flush = time.monotonic()
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS progress (
+                omsid TEXT NOT NULL,
+                store_id TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (omsid, store_id)
+            )
+        ''')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.conn.commit()
+
+    def reset(self, **meta):
+        """Start a new run: forget previous progress and store the run settings"""
+        self.conn.execute('DELETE FROM progress')
+        self.conn.execute('DELETE FROM meta')
+        self.conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', [(k, str(v)) for k, v in meta.items()])
+        self.conn.commit()
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def record(self, omsid, store_id, outcome):
+        self.pending.append((str(omsid), str(store_id), outcome, time.time()))
+        if len(self.pending) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def record_many(self, keys, outcome):
+        now = time.time()
+        self.pending.extend((str(omsid), str(store_id), outcome, now) for omsid, store_id in keys)
+        if len(self.pending) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.conn.executemany('''
+                INSERT INTO progress (omsid, store_id, outcome, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (omsid, store_id) DO UPDATE SET outcome = excluded.outcome, updated_at = excluded.updated_at
+            ''', self.pending)
+            self.conn.commit()
+            self.pending = []
+        self.last_flush = time.monotonic()
+
+    def completed_stores(self, omsid):
+        """Store ids already finished for a product, looked up per product to keep memory flat"""
+        rows = self.conn.execute(
+            f'SELECT store_id FROM progress WHERE omsid = ? AND outcome IN ({",".join("?" * len(DONE_OUTCOMES))})',
+            (str(omsid), *DONE_OUTCOMES)
+        )
+        return {row[0] for row in rows}
+
+    def counts(self):
+        return dict(self.conn.execute('SELECT outcome, COUNT(*) FROM progress GROUP BY outcome').fetchall())
+
+    def close(self):
+        self.flush()
+        self.conn.close()
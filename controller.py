@@ -0,0 +1,173 @@
+import asyncio, time
+from collections import deque
+
+
+"""
+Adaptive (AIMD) concurrency and rate controller for upstream requests
+"""
+
+# Statuses that mean the upstream wants us to slow down
+PUSHBACK_STATUSES = {429, 503, 504, 'timeout'}
+
+
+class Slot():
+    def __init__(self, controller):
+        self.controller = controller
+        self.status = None
+        self.started = None
+        # Set when the request goes through a proxy route, whose timeouts its breaker handles
+        self.route = None
+
+    async def __aenter__(self):
+        await self.controller.acquire()
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, asyncio.TimeoutError):
+            self.status = 'timeout'
+        elif exc_type is not None and self.status is None:
+            self.status = 'error'
+        self.controller.release(self.status, time.monotonic() - self.started, routed=self.route is not None)
+        return False
+
+
+class AdaptiveController():
+    def __init__(self, concurrency=20, min_concurrency=2, max_concurrency=200,
+                 rate=10.0, min_rate=1.0, max_rate=100.0,
+                 concurrency_step=1, rate_step=0.5, decrease_factor=0.5,
+                 latency_target=5.0, window=500, adjust_interval=2.0, shared_limiter=None,
+                 pushback_threshold=0.05, pushback_window=100, min_samples=20):
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency_step = concurrency_step
+        self.rate_step = rate_step
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.adjust_interval = adjust_interval
+        # Limits are cut when more than this share of recent requests was pushed back
+        self.pushback_threshold = pushback_threshold
+        self.min_samples = min_samples
+        # Optional cross-process limit on top of the adaptive local rate
+        self.shared_limiter = shared_limiter
+
+        self.inflight = 0
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=pushback_window)  # 1 for a pushback, since the last cut
+        self.pushbacks = 0
+        self.requests = 0
+        self.increases = 0
+        self.decreases = 0
+
+        # Token bucket for the request rate
+        self.tokens = 1.0
+        self.last_fill = time.monotonic()
+        self.last_adjust = time.monotonic()
+        self.last_decrease = 0.0
+        self.waiters = deque()
+
+    def _fill(self):
+        now = time.monotonic()
+        self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.last_fill) * self.rate)
+        self.last_fill = now
+
+    async def acquire(self):
+        while self.inflight >= int(self.concurrency):
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+                raise
+        self.inflight += 1
+
+        # Rate token is taken after the concurrency slot
+        while True:
+            self._fill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                break
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+        if self.shared_limiter is not None:
+            await self.shared_limiter.acquire()
+
+    def release(self, status, latency, routed=False):
+        self.inflight -= 1
+        self.requests += 1
+        self.latencies.append(latency)
+
+        # A proxy timing out says nothing about upstream load, its route breaker deals with it
+        if not (routed and status == 'timeout'):
+            pushback = status in PUSHBACK_STATUSES
+            self.pushbacks += pushback
+            self.outcomes.append(1 if pushback else 0)
+
+        if self.pushback_share() > self.pushback_threshold:
+            # Enough requests are pushed back to be a real signal, not a stray 503
+            self._decrease()
+        elif time.monotonic() - self.last_adjust >= self.adjust_interval:
+            self._adjust()
+
+        self._wake()
+
+    def _wake(self):
+        free = int(self.concurrency) - self.inflight
+        while free > 0 and self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def pushback_share(self):
+        if len(self.outcomes) < self.min_samples:
+            return 0.0
+        return sum(self.outcomes) / len(self.outcomes)
+
+    def _decrease(self):
+        # One cut per interval, a burst of 429s is a single signal
+        now = time.monotonic()
+        if now - self.last_decrease < self.adjust_interval:
+            return
+        self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease_factor)
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self.tokens = min(self.tokens, 1.0)
+        self.last_decrease = now
+        self.last_adjust = now
+        # Judge the new limits on their own requests
+        self.outcomes.clear()
+        self.decreases += 1
+
+    def _adjust(self):
+        healthy = self.pushback_share() <= self.pushback_threshold and self.percentile(95) <= self.latency_target
+        self.last_adjust = time.monotonic()
+        if not healthy:
+            self._decrease()
+            return
+
+        # Only grow when the current limits are actually being used
+        if self.inflight + 1 >= int(self.concurrency) or self.tokens < 1:
+            self.concurrency = min(self.max_concurrency, self.concurrency + self.concurrency_step)
+            self.rate = min(self.max_rate, self.rate + self.rate_step)
+            self.increases += 1
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return 0.0
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+    def slot(self):
+        return Slot(self)
+
+    def summary(self):
+        return (f"controller: concurrency {int(self.concurrency)}, rate {self.rate:.1f}/s, "
+                f"p50 {self.percentile(50):.2f}s, p95 {self.percentile(95):.2f}s, "
+                f"{self.pushbacks} pushbacks in {self.requests} requests, "
+                f"{self.increases} increases / {self.decreases} decreases")
@@ -0,0 +1,85 @@
+import json
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+"""
+Minimal-field decoding of /fulcra/pd/productId responses.
+Only the fields format_data reads are kept, the rest of the payload
+(fulfillment, badges, recommendations...) is never turned into Python objects
+when simdjson is available.
+"""
+
+# Fields of the 'product' object read by LOWES.format_data
+PRODUCT_FIELDS = ('description', 'brand', 'pdURL', 'reviewCount', 'rating', 'modelId', 'itemNumber', 'omniItemId', 'imageUrl')
+
+# Fields still needed when the product metadata is already cached
+INVENTORY_FIELDS = ('omniItemId',)
+
+
+def _plain(value):
+    # simdjson containers -> Python, scalars are already plain
+    if simdjson is not None and isinstance(value, (simdjson.Object, simdjson.Array)):
+        return value.as_dict() if isinstance(value, simdjson.Object) else value.as_list()
+    return value
+
+
+def _extract(doc, fields=PRODUCT_FIELDS):
+    """Pick errors + the needed product fields out of a dict-like document"""
+    if not hasattr(doc, 'get'):
+        raise ValueError(f'Expected a JSON object, got {type(doc).__name__}')
+    result = {}
+    errors = doc.get('errors')
+    if errors:
+        result['errors'] = _plain(errors)
+
+    product = doc.get('product')
+    if product is None or not hasattr(product, 'get'):
+        result['product'] = _plain(product)
+        return result
+
+    picked = {}
+    for field in fields:
+        value = product.get(field)
+        if value is not None:
+            picked[field] = _plain(value)
+
+    inventory = product.get('itemInventory')
+    if inventory is not None and hasattr(inventory, 'get'):
+        picked['itemInventory'] = {'totalQty': _plain(inventory.get('totalQty', 0))}
+
+    result['product'] = picked
+    return result
+
+
+if simdjson is not None:
+    _parser = simdjson.Parser()
+
+    def _decode_simdjson(body, fields=PRODUCT_FIELDS):
+        # The parser holds one document at a time; everything is copied out before returning
+        return _extract(_parser.parse(body), fields)
+
+    decode_product_response = _decode_simdjson
+    BACKEND = 'simdjson'
+
+elif orjson is not None:
+    def _decode_orjson(body, fields=PRODUCT_FIELDS):
+        return _extract(orjson.loads(body), fields)
+
+    decode_product_response = _decode_orjson
+    BACKEND = 'orjson'
+
+else:
+    def _decode_json(body, fields=PRODUCT_FIELDS):
+        return _extract(json.loads(body), fields)
+
+    decode_product_response = _decode_json
+    BACKEND = 'json'
@@ -0,0 +1,159 @@
+import atexit, copy, json, logging, logging.handlers, queue, random, threading, time
+
+
+"""
+Structured JSON-lines logging.
+Records are filtered (level, sampling, per-message rate limit) in the calling thread,
+then handed to a queue; a background listener formats and writes them to a rotating file,
+so request coroutines never wait on disk I/O.
+"""
+
+ROOT_LOGGER = 'lowes'
+
+# Attributes every LogRecord has, anything else was passed through `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+_rate_filter = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('[%(asctime)s] [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Merge args in the caller's thread but keep the traceback apart for the JSON field
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingRateLimitFilter(logging.Filter):
+    """
+    Keeps at most `burst` records per (logger, level, message template) every `interval` seconds.
+    The first record let through after a quiet period carries the number suppressed meanwhile.
+    `sample_rates` optionally keeps only a fraction of records per level, e.g. {logging.DEBUG: 0.1}.
+    """
+
+    def __init__(self, burst=10, interval=10.0, sample_rates=None):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.sample_rates = sample_rates or {}
+        self.windows = {}  # key -> [window_start, emitted, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        rate = self.sample_rates.get(record.levelno)
+        if rate is not None and random.random() >= rate:
+            return False
+        if not self.burst:
+            return True
+
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self.windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+    def drain(self):
+        """(name, level, template, suppressed) for windows that ended with records still suppressed"""
+        with self.lock:
+            pending = [(name, level, msg, window[2]) for (name, level, msg), window in self.windows.items() if window[2]]
+            self.windows.clear()
+        return pending
+
+
+def setup_logging(log_file, level=logging.INFO, console_level=logging.ERROR, max_bytes=10 * 1024 * 1024,
+                  backup_count=5, burst=10, interval=10.0, sample_rates=None):
+    """Route the 'lowes' loggers through a queue to a rotating JSON-lines file (and stderr from console_level)"""
+    global _listener, _rate_filter
+    with _lock:
+        if _listener is not None:
+            shutdown_logging()
+
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        file_handler.setFormatter(JsonFormatter())
+        file_handler.setLevel(level)
+        handlers = [file_handler]
+        if console_level is not None:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(ConsoleFormatter())
+            console_handler.setLevel(console_level)
+            handlers.append(console_handler)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _QueueHandler(log_queue)
+        _rate_filter = SamplingRateLimitFilter(burst=burst, interval=interval, sample_rates=sample_rates)
+        queue_handler.addFilter(_rate_filter)
+
+        logger = logging.getLogger(ROOT_LOGGER)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(queue_handler)
+        logger.setLevel(min(level, console_level if console_level is not None else level))
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    return logger
+
+
+def shutdown_logging():
+    """Report still-suppressed repeats, then flush the queue and stop the background writer"""
+    global _listener
+    if _listener is None:
+        return
+    for name, level, msg, suppressed in _rate_filter.drain():
+        logging.getLogger(name).log(level, 'Suppressed %d repeats of: %s', suppressed, msg)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def configured():
+    return _listener is not None
+
+
+def get_logger(name):
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+atexit.register(shutdown_logging)
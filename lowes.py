@@ -1,18 +1,81 @@
-import requests,json,os,uuid,time,random,string,csv, http.client, asyncio, aiohttp
+import json,os,uuid,time,random,string,csv, asyncio, aiohttp, contextlib, types
 from utils import Utils
+from session_pool import SessionPool
+from retry import RetryPolicy, RETRYABLE, PERMANENT, AUTH
+from decoding import decode_product_response, PRODUCT_FIELDS, INVENTORY_FIELDS
+from metrics import Metrics
+from routes import RouteSelector
+from product_cache import ProductCache
+import jsonlog
 
-from requests.exceptions import ProxyError, ConnectionError, Timeout
-http.client._MAXHEADERS = 1000
-from urllib3.exceptions import InsecureRequestWarning
-requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
-from datetime import datetime,timedelta,timezone
-import concurrent.futures
+from collections import namedtuple
+from urllib.parse import urlencode, quote
+from yarl import URL
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+log = jsonlog.get_logger(__name__)
 
 
 """
 Creating a class for Lowes
 """
 
+# Compact records holding only what a scan needs
+Product = namedtuple('Product', ['omsid', 'sku'])
+Store = namedtuple('Store', ['store_id', 'store_name', 'address', 'city', 'state', 'zipcode'])
+
+# A store compiled once per run: its encoded query string and preformatted output fields
+StoreContext = namedtuple('StoreContext', ['store_id', 'store_name', 'store_location', 'query'])
+
+
+def read_stores(stores_file, stats=None):
+    """Yield (Store, region, area, (lat, long) or None) for the stores in store_ids.json with a valid zipcode"""
+    with open(stores_file, 'rb') as f:
+        # ijson walks the file incrementally, otherwise parse it once and convert
+        rows = ijson.items(f, 'data.item') if ijson is not None else json.load(f)['data']
+        for row in rows:
+            if stats is not None:
+                stats['total'] += 1
+            zipcode = (row.get('zipcode') or '').strip()
+            if not Utils.valid_zipcode(zipcode):
+                if stats is not None:
+                    stats['invalid'] += 1
+                continue
+            store = Store(str(row.get('store_id', '')), row.get('store_name', ''), row.get('address', ''), row.get('city', ''), row.get('state', ''), zipcode)
+            try:
+                cords = row.get('cords') or {}
+                coords = (float(cords['lat']), float(cords['long']))
+            except (KeyError, TypeError, ValueError):
+                coords = None
+            yield store, str(row.get('region_number', '')), str(row.get('area_number', '')), coords
+
+# Query parameters of the product detail request, storeNumber is added per store
+PRODUCT_PARAMS = (
+    ('enablePaintConfig', 'true'),
+    ('enableFulfillmentV2', 'true'),
+    ('showAtc', 'true'),
+    ('enableNewBadges', 'true'),
+    ('customerType', 'REGULAR'),
+    ('carouselBadge', 'true'),
+    ('purchaseFromCatalog', 'false'),
+    ('associations', 'pd'),
+    ('promoType', 'unknown'),
+    ('promotionId', ''),
+    ('storeNumber', None),
+    ('enableLiftOffRecs', 'true'),
+    ('supportBuyAgain', 'false'),
+    ('enableCurbsideSelection', 'true'),
+    ('hasAdditionalServices', 'true'),
+    ('organizationId', ''),
+    ('role', ''),
+    ('enableSameDayDelivery', 'true'),
+)
+
+
 class NotFound(Exception):
     def __init__(self, message="Product not found"):
         super().__init__(message)
@@ -21,6 +84,10 @@ class LOWES():
     def __init__(self,proxies = None):
         self.proxies = Utils.load_proxies() if proxies is None else [proxies]
         self.proxy_cert = False
+        # Health-scored routes with circuit breakers, built from the proxy list
+        self.routes = RouteSelector(self.proxies)
+        # Dead routes fail on connect instead of using the whole request timeout
+        self.connect_timeout = 10
         self.headers = {
             'user-agent': 'lowesMobileApp/25.10.6 (iPhone; iOS 18.6.2)',
             'os': 'ios',
@@ -35,6 +102,43 @@ class LOWES():
 
         self.root_dir = os.path.dirname(__file__)
         self.name = 'lowes'
+        # Overridden to point at the local mock server in benchmarks
+        self.api_base = 'https://apis.lowes.com'
+
+        # One connection pool for every request this instance makes
+        self.pool = SessionPool()
+
+        # Optional AdaptiveController gating product requests
+        self.controller = None
+
+        # Request counters/latencies, per-row prints only when verbose
+        self.metrics = Metrics()
+        self.verbose = 0
+
+        # Store-independent product fields, formatted once per omsid and reused until they expire
+        self.product_cache = ProductCache(ttl=3600)
+
+        # Decode only the product fields we use (simdjson/orjson when installed)
+        self.fast_decode = True
+
+        # Error classification and backoff for product and token requests
+        self.retry_policy = RetryPolicy(max_attempts=Utils.get_retries_count() + 1)
+        self.token_retry_policy = RetryPolicy(retry_statuses=(503, 412, 456, 522, 408, 502, 403))
+
+    async def open_session(self):
+        return await self.pool.open()
+
+    async def close_session(self):
+        await self.pool.close()
+
+    @property
+    def session(self):
+        return self.pool.session
+
+    def request_slot(self):
+        if self.controller is not None:
+            return self.controller.slot()
+        return contextlib.nullcontext(types.SimpleNamespace(status=None))
         
     def generate_sensor_data(self,type="sensor_data"):
         if type == "sensor_data":
@@ -54,159 +158,162 @@ class LOWES():
         
         elif type == "random_string_upper":
             return  ''.join(random.choices(string.ascii_letters.upper() + string.ascii_letters + string.digits, k=40))
+
+    def build_token_headers(self):
+        # Fresh device identity for every token
+        headers = self.headers.copy()
+        headers.update({
+            'deviceid': str(uuid.uuid4()).upper(),
+            'epid': str(uuid.uuid4()).upper(),
+            'adid': self.generate_sensor_data(type="random_number"),
+            'x-lowes-uuid': f'ca829819-f33a-44c5-b294-{self.generate_sensor_data(type="random_string")}',
+            'x-acf-sensor-data': self.generate_sensor_data(type="sensor_data"),
+        })
+        return headers
     
         
-    def format_data(self,store,sku,data:dict):
-        try:
-            name = data.get('description', '')
-            brand = data.get('brand', '')
-            canonicalUrl = data.get('pdURL')
-            url = f"https://www.lowes.com/{canonicalUrl}" if canonicalUrl else ''
-
-            reviews = data.get('reviewCount', 0)
-            rating = data.get('rating', 0)
-
-            model = data.get('modelId')
-            retailer = "Lowes"
-            storesku = data.get('itemNumber')
-            omsid = data.get('omniItemId')
-            store_name = Utils.safe_get(store, 'store_name', default='')
-            store_id = Utils.safe_get(store, 'store_id', default='')
-            store_location = f"{Utils.safe_get(store, 'address', default='')}, {Utils.safe_get(store, 'city', default='')}, {Utils.safe_get(store, 'state', default='')} {Utils.safe_get(store, 'zipcode', default='')}"
+    def store_context(self, store):
+        """Compile a Store into the StoreContext used by requests and format_data"""
+        params = [(key, store.store_id if key == 'storeNumber' else value) for key, value in PRODUCT_PARAMS]
+        return StoreContext(
+            store.store_id,
+            store.store_name,
+            f"{store.address}, {store.city}, {store.state} {store.zipcode}",
+            urlencode(params),
+        )
+
+    def format_product(self,data:dict):
+        """Store-independent product fields, cached per omsid"""
+        canonicalUrl = data.get('pdURL')
+        storesku = data.get('itemNumber')
+        return {
+            "name":data.get('description', ''),
+            "brand":data.get('brand', ''),
+            "url":f"https://www.lowes.com/{canonicalUrl}" if canonicalUrl else '',
+            "mainImageurl":data.get('imageUrl', None),
+            "sku":storesku,
+            "reviews":data.get('reviewCount', 0),
+            "rating":data.get('rating', 0),
+            "model":data.get('modelId'),
+            "retailer":"Lowes",
+            "storesku":storesku,
+            "omsid":data.get('omniItemId'),
+        }
 
+    def format_data(self,store,sku,data:dict,product=None):
+        try:
+            # Product fields come from the cache when available, only the inventory is per store
+            result = dict(product) if product is not None else self.format_product(data)
             total = data.get('itemInventory',{}).get('totalQty',0)
-
-            mainImageurl = data.get('imageUrl', None)
-            
-            result = {
-                "name":name,
-                "brand":brand,
-                "url":url,
-                "mainImageurl":mainImageurl,
-                "sku":storesku,
-                "reviews":reviews,
-                "rating":rating,
-                "model":model,
-                "retailer":retailer,
-                "storesku":storesku,
-                "omsid":omsid,
-                "store_name":store_name,
-                "store_id":store_id,
-                "store_location":store_location,
-                "inventory":total
-            }
-            print(f"{sku} at {store_name} - {total} items in stock")
+            result["store_name"] = store.store_name
+            result["store_id"] = store.store_id
+            result["store_location"] = store.store_location
+            result["inventory"] = total
+            result["timestamp"] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            if self.verbose:
+                log.debug('%s at %s - %s items in stock', sku, store.store_name, total)
             return True,result
         except Exception as error:
             return False,'Could not format data: ' + str(error)
 
-    async def get_product_details_async(self, headers, session,  store, sku, delay=0.1, timeout=30, retries=Utils.get_retries_count()):
+    async def get_product_details_async(self, tokens, session,  store, sku, delay=0.1, timeout=30, fields=PRODUCT_FIELDS):
+        """
+        Single attempt. Failures come back as {'kind', 'status', 'message'} so the caller
+        can defer retries instead of retrying inline, 'Not Available' for missing products.
+        tokens() is awaited for a token once the request slot is granted; a 401 result carries
+        the rejected token so the caller can invalidate it.
+        """
         success, result = False, {}
         try:
             await asyncio.sleep(delay)
-            proxies = random.choice(self.proxies) if self.proxies is not None and len(self.proxies) > 0 else None
-
-            # Handle multiple product requests
-            params = {
-                'enablePaintConfig': 'true',
-                'enableFulfillmentV2': 'true',
-                'showAtc': 'true',
-                'enableNewBadges': 'true',
-                'customerType': 'REGULAR',
-                'carouselBadge': 'true',
-                'purchaseFromCatalog': 'false',
-                'associations': 'pd',
-                'promoType': 'unknown',
-                'promotionId':'' ,
-                'storeNumber': f'{store["store_id"]}',
-                'enableLiftOffRecs': 'true',
-                'supportBuyAgain': 'false',
-                'enableCurbsideSelection': 'true',
-                'hasAdditionalServices': 'true',
-                'organizationId':'',
-                'role': '',
-                'enableSameDayDelivery': 'true',
-            }
-
-            # Create proxy format for aiohttp
-            proxy_url = None
-            if proxies:
-                if isinstance(proxies, str) and proxies.startswith('http'):
-                    proxy_url = proxies
-                elif isinstance(proxies, dict):
-                    proxy_url = proxies.get('http') or proxies.get('https')
 
+            route = started = status = None
+            reported = False
             try:
-                async with session.get(
-                    f'https://apis.lowes.com/fulcra/pd/productId/{sku}',
-                    params=params,
-                    headers=headers,
-                    proxy=proxy_url,
-                    timeout=timeout,
-                    verify_ssl=self.proxy_cert
-                ) as response:
-                    if response.status == 200:
-                        resp_json = await response.json()
-                        if resp_json.get('errors'):
-                            error_msg = resp_json.get('errors', [{}])[0].get('message', 'Unknown error')
-                            # Check if this is a product-not-available error (don't retry)
-                            if any(keyword in error_msg.lower() for keyword in [
-                                'product not found', 'discontinued', 'no longer available',
-                                'invalid product', 'not found', 'does not exist'
-                            ]):
-                                raise NotFound(f'Item {sku} not available: {error_msg}')
+                # The controller slot only covers the HTTP exchange
+                async with self.request_slot() as slot:
+                    # Borrowed only now, so it can't go stale while waiting for the slot
+                    token = await tokens()
+                    # Picked last so a half-open probe is only held for the HTTP exchange,
+                    # routes with an open breaker are skipped
+                    route = slot.route = self.routes.pick()
+                    started = time.monotonic()
+                    # Query string is pre-encoded per store, so aiohttp doesn't rebuild or requote it
+                    async with session.get(
+                        URL(f'{self.api_base}/fulcra/pd/productId/{quote(str(sku), safe="")}?{store.query}', encoded=True),
+                        headers=token.headers,
+                        proxy=route.proxy_url if route else None,
+                        timeout=aiohttp.ClientTimeout(total=timeout, connect=self.connect_timeout),
+                        verify_ssl=self.proxy_cert
+                    ) as response:
+                        status = slot.status = response.status
+                        if status == 200:
+                            if self.fast_decode:
+                                # Only the fields format_data needs, decoded from the raw bytes
+                                resp_json = decode_product_response(await response.read(), fields)
                             else:
-                                # Retryable API error
-                                if retries > 0:
-                                    print(f'API error for item {sku} at {store["store_name"]}, retrying: {error_msg}')
-                                    success, result = await self.get_product_details_async(
-                                        headers, session, store, sku, delay=delay, timeout=timeout, retries=retries - 1
-                                    )
-                                    return success, result
-                                else:
-                                    raise Exception(error_msg)
-                        # Validate product data exists
-                        products = resp_json.get('product')
-                        if not products:
-                            raise NotFound(f'Item {sku} not available - no product data in response')
-                        success, result = True, resp_json
-                    elif response.status == 401:  # Token expired
-                        return False, {'status': 401, 'message': 'Token expired'}
-                    elif response.status in [429, 503, 504, 408] and retries > 0:  # Rate limit or server errors - retry
-                        print(f'Rate limit/server error {response.status} for item {sku} at {store["store_name"]}, retrying...')
-                        success, result = await self.get_product_details_async(
-                            headers, session, store, sku, delay=delay, timeout=timeout, retries=retries - 1
-                        )
-                        return success, result
-                    else:
-                        # Client errors (4xx except 401, 429) or other status codes - assume permanent issue
-                        error_text = await response.text()
-                        raise Exception(f'Response status {response.status}: {error_text}')
-            except (aiohttp.ClientError) as e:
-                # Network/proxy/connection errors - should retry
-                if retries > 0:
-                    print(f'Network/proxy error for item {sku} at {store["store_name"]}, retrying: {str(e)}')
-                    success, result = await self.get_product_details_async(
-                        headers, session, store, sku, delay=delay, timeout=timeout, retries=retries - 1
-                    )
-                else:
-                    raise Exception(f'Network error (retries exhausted): {str(e)}')
-                
+                                resp_json = await response.json()
+                        else:
+                            error_text = await response.text()
+                self.metrics.observe_request('product', status, time.monotonic() - started)
+                self.routes.report(route, status=status, latency=time.monotonic() - started)
+                reported = True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if started is not None:
+                    self.metrics.observe_request('product', 'timeout' if isinstance(e, asyncio.TimeoutError) else 'error', time.monotonic() - started)
+                self.routes.report(route, error=e)
+                reported = True
+                # Network/proxy/connection errors - the caller decides whether to retry
+                return False, {'kind': self.retry_policy.classify(error=e), 'status': None, 'message': f'Network error: {str(e) or type(e).__name__}'}
+            except ValueError as e:
+                # A 200 that isn't a JSON object is usually a proxy or block page, another route may get through
+                if started is not None:
+                    self.metrics.observe_request('product', 'undecodable', time.monotonic() - started)
+                self.routes.report(route, error=e)
+                reported = True
+                return False, {'kind': RETRYABLE, 'status': status, 'message': f'Undecodable response: {e}'}
+            finally:
+                if not reported:
+                    # The exchange ended without a verdict (cancelled, unexpected error): free a half-open probe
+                    self.routes.release(route)
+
+            if status == 200:
+                if resp_json.get('errors'):
+                    error_msg = resp_json.get('errors', [{}])[0].get('message', 'Unknown error')
+                    # Check if this is a product-not-available error (don't retry)
+                    if any(keyword in error_msg.lower() for keyword in [
+                        'product not found', 'discontinued', 'no longer available',
+                        'invalid product', 'not found', 'does not exist'
+                    ]):
+                        raise NotFound(f'Item {sku} not available: {error_msg}')
+                    # Other API errors are retryable
+                    return False, {'kind': RETRYABLE, 'status': status, 'message': f'API error: {error_msg}'}
+                # Validate product data exists
+                products = resp_json.get('product')
+                if not products:
+                    raise NotFound(f'Item {sku} not available - no product data in response')
+                success, result = True, resp_json
+            elif status == 401:  # Token expired
+                return False, {'kind': AUTH, 'status': 401, 'message': 'Token expired', 'token': token}
+            else:
+                # Rate limits and server errors are retryable, other client errors are permanent
+                return False, {'kind': self.retry_policy.classify(status=status), 'status': status, 'message': f'Response status {status}: {error_text[:200]}'}
+
         except NotFound as nf:
             success, result = False, 'Not Available'
 
         except Exception as error:
-            success, result = False, f"error getting product: {error}"
+            success, result = False, {'kind': PERMANENT, 'status': None, 'message': f"error getting product: {error}"}
 
         return success, result
 
-    def load_stores(self):
-        # Load store details from store_list.csv
-        stores = []
-        stores_file = os.path.join(self.root_dir, 'store_ids.json')
-        with open(stores_file, 'r', encoding='utf-8') as f:
-            stores = json.load(f)['data']
-        return stores
+    def iter_stores(self, stats=None):
+        """Yield Store records with a valid zipcode from store_ids.json"""
+        for store, _, _, _ in read_stores(os.path.join(self.root_dir, 'store_ids.json'), stats=stats):
+            yield store
+
+    def load_stores(self, stats=None):
+        return list(self.iter_stores(stats=stats))
     
 
     async def get_token_async(self, headers, batch_num, delay=0.1, timeout=30, verify=True, retries=None):
@@ -225,94 +332,91 @@ class LOWES():
                 'grant_type': 'client_credentials',
             }
 
-            proxies = random.choice(self.proxies) if self.proxies is not None and len(self.proxies) > 0 else None
-            proxy_url = None
-            if proxies:
-                if isinstance(proxies, str) and proxies.startswith('http'):
-                    proxy_url = proxies
-                elif isinstance(proxies, dict):
-                    proxy_url = proxies.get('http') or proxies.get('https')
+            session = await self.open_session()
+            attempt = 0
+            while True:
+                # Pick a new route for every attempt
+                route = self.routes.pick()
+                proxy_url = route.proxy_url if route else None
 
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+                started = time.monotonic()
                 try:
                     async with session.post(
-                        'https://apis.lowes.com/v1/oauthprovider/oauth2/token',
+                        f'{self.api_base}/v1/oauthprovider/oauth2/token',
                         headers=headers,
                         data=data,
-                        proxy=proxy_url,
+                        proxy=route.proxy_url if route else None,
+                        timeout=aiohttp.ClientTimeout(total=timeout, connect=self.connect_timeout),
                         verify_ssl=verify
                     ) as response:
+                        self.metrics.observe_request('token', response.status, time.monotonic() - started)
+                        self.routes.report(route, status=response.status, latency=time.monotonic() - started)
                         if response.status == 200:
                             resp_json = await response.json()
-                            success, result = True, resp_json['access_token']
-                        elif response.status in [503, 412, 456, 522, 408, 502, 403] and retries > 0:
-                            print('Failed to get token, retrying...')
-                            success, result, retries = await self.get_token_async(delay, timeout, verify, retries - 1)
-                        else:
-                            error_text = await response.text()
-                            return False, error_text, retries
-                except aiohttp.ClientError as e:
-                    Utils.write_log(e)
-                    if retries > 0:
-                        print('Failed to get token, retrying...')
-                        success, result, retries = await self.get_token_async(delay, timeout, verify, retries - 1)
-                    else:
-                        return False, str(e), retries
+                            return True, resp_json['access_token'], retries
+                        error_text = await response.text()
+                        kind = self.token_retry_policy.classify(status=response.status)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    self.metrics.observe_request('token', 'timeout' if isinstance(e, asyncio.TimeoutError) else 'error', time.monotonic() - started)
+                    self.routes.report(route, error=e)
+                    log.warning('Token request failed: %s', str(e) or type(e).__name__)
+                    error_text = str(e) or type(e).__name__
+                    kind = self.token_retry_policy.classify(error=e)
+
+                if kind != RETRYABLE or retries <= 0:
+                    return False, error_text, retries
+
+                retries -= 1
+                attempt += 1
+                log.info('Failed to get token, retrying (attempt %d)', attempt)
+                await asyncio.sleep(self.token_retry_policy.backoff(attempt))
 
         except Exception as error:
             return False, f'Error getting token for batch {batch_num} : {error}', retries
 
-        return success, result, retries
-
-    def load_products(self,products_file):
-        # Load store details from store_list.csv
-        products = []
+    def iter_products(self, products_file, stats=None):
+        """Stream Product records with a valid omsid from the products CSV"""
         products_file_path = os.path.join(self.root_dir,products_file)
         with open(products_file_path, 'r', encoding='utf-8') as csvf:
             reader = csv.DictReader(csvf)
             for row in reader:
-                product = {
-                    'name': row['name'],
-                    'brand': row['brand'],
-                    'url': row['url'],
-                    'mainImageurl': row['mainImageurl'],
-                    'SKU': row['SKU'],
-                    'Reviews': row['Reviews'],
-                    'Rating': row['Rating'],
-                    'Model': row['Model'],
-                    'retailer': row['retailer'],
-                    'storesku': row['storesku'],
-                    'omsid': row['omsid'],
-                    'storeName': row.get('storeName'),
-                    'storeID': row.get('storeID'),
-                    'storeLocation': row.get('storeLocation'),
-                    'inventory': row.get('inventory'),
-                }
-                if product.get('SKU') is not None and product.get('omsid') is not None:products.append(product)
-        return products
+                if stats is not None:
+                    stats['total'] += 1
+                omsid = (row.get('omsid') or '').strip()
+                if not Utils.valid_omsid(omsid):
+                    if stats is not None:
+                        stats['invalid'] += 1
+                    continue
+                yield Product(omsid, row.get('SKU') or '')
+
+    def load_products(self, products_file, stats=None):
+        return list(self.iter_products(products_file, stats=stats))
                
-    async def scan_items_async(self, session, store, product, headers, token, delay=0.1, timeout=30):
+    async def scan_items_async(self, session, store, product, tokens, delay=0.1, timeout=30):
         try:
-            # Headers and token are provided by caller (worker)
-            headers['authorization'] = f'Bearer {token}'
-
+            # Cached products only need their inventory decoded
+            metadata = self.product_cache.get(product.omsid)
             success, item = await self.get_product_details_async(
-                headers, session, store, product['omsid'], delay=delay, timeout=timeout
+                tokens, session, store, product.omsid, delay=delay, timeout=timeout,
+                fields=INVENTORY_FIELDS if metadata is not None else PRODUCT_FIELDS
             )
 
             if not success:
                 return False, item
 
             # Single product response
-            product = item.get('product', {})
-            if product:
-                success_format, formatted = self.format_data(store, product['omniItemId'], product)
+            data = item.get('product', {})
+            if data:
+                if metadata is None:
+                    metadata = self.format_product(data)
+                    self.product_cache.put(product.omsid, metadata)
+                success_format, formatted = self.format_data(store, data['omniItemId'], data, metadata)
                 if success_format:
-                    return True, {"store": store['store_id'], "data": formatted}
+                    return True, {"store": store.store_id, "data": formatted}
                 else:
-                    return False, {"store": store['store_id'], "message": f'Format error: {formatted}'}
+                    return False, {"store": store.store_id, "message": f'Format error: {formatted}'}
             else:
-                return False, {"store": store['store_id'], "message": "No product data in response"}
+                return False, {"store": store.store_id, "message": "No product data in response"}
 
         except Exception as error:
-            return False, {"store": store['store_id'], "message": f'Error scanning item: {error}'}
+            return False, {"store": store.store_id, "message": f'Error scanning item: {error}'}
@@ -1,183 +1,455 @@
-from lowes import LOWES, NotFound
-import os, csv, concurrent.futures, asyncio, aiohttp
+from lowes import LOWES
+from token_broker import TokenBroker
+from writer import ResultWriter, WriterError
+from sinks import CSVSink, ParquetSink, NormalizedCSVSink
+from checkpoint import ProgressJournal
+from scheduler import JobScheduler, ORDERS
+from controller import AdaptiveController
+from retry import PERMANENT, AUTH
+from shard import parse_shard, shard_of, shard_suffix, SharedRateLimiter, merge_shards
+from store_index import StoreIndex
+from volatility import VolatilityTracker
+from changefeed import diff_runs, CHANGE_FORMATS
+from sampling import StratifiedSample, SamplingEstimator
+import jsonlog
+import os, sys, asyncio, argparse, functools, subprocess, logging
 from datetime import datetime
-import json, time, uuid
-from collections import deque
 
+log = jsonlog.get_logger(__name__)
 
-async def main_async():
-    lowes = LOWES()
 
-    products = lowes.load_products('Lowes Products 2025 12 09.csv')
-    stores = lowes.load_stores()
+async def main_async(output_format='csv', resume=False, chunk_size=50, order='product-major',
+                     shard=None, shared_rate=None, run_date=None, verbose=0, metrics_port=None, summary_interval=30,
+                     store_filter=None, incremental=False, max_interval=7, change_threshold=0.5, budget=None, changes=None,
+                     sample_fraction=None, stratify='state', min_per_stratum=1, confidence=0.95, escalate_width=None,
+                     lowes=None, products_file='Lowes Products 2025 12 09.csv'):
+    lowes = lowes or LOWES()
+    lowes.verbose = verbose
 
-    # Filter out products with invalid OMSID (critical since we use it for API calls)
-    valid_products = []
-    for product in products:
-        omsid_val = product.get('omsid', '').strip()
+    # Errors go to a rotating JSON-lines log through a background writer; -v also shows debug records
+    owns_logging = not jsonlog.configured()
+    if owns_logging:
+        jsonlog.setup_logging(
+            os.path.join(lowes.root_dir, 'logs.jsonl'),
+            level=logging.DEBUG if verbose else logging.INFO,
+            console_level=logging.DEBUG if verbose else logging.ERROR,
+        )
 
-        # Strict OMSID validation - disqualify on any of these invalid values
-        if (omsid_val is None or
-            omsid_val == '' or
-            omsid_val.lower() in ['null', 'none', 'n/a', 'na'] or
-            omsid_val == '0'):
-            continue  # Skip this invalid product
+    # Products and stores are validated while they are read and kept as compact records
+    product_stats = {'total': 0, 'invalid': 0}
+    num_products = sum(1 for _ in lowes.iter_products(products_file, stats=product_stats))
 
-        valid_products.append(product)
+    # Stores come from the cached index, optionally narrowed by state/region/area or distance
+    store_index = StoreIndex.load(lowes.root_dir)
+    # Each store is compiled once into its request query and output fields
+    valid_stores = [lowes.store_context(store) for store in store_index.select(**(store_filter or {}))]
 
-    print(f"Filtered {len(products)} to {len(valid_products)} valid products ({len(products) - len(valid_products)} invalid)")
-
-    # Filter out stores with invalid/incorrect zipcodes
-    valid_stores = []
-    for store in stores:
-        zipcode = store.get('zipcode', '').strip()
-        if (zipcode and
-            len(zipcode) >= 5 and
-            zipcode.isdigit() and
-            zipcode != '0'):
-            valid_stores.append(store)
-
-    print(f"Filtered {len(stores)} to {len(valid_stores)} valid stores ({len(stores) - len(valid_stores)} invalid)")
-
-    test_store = valid_stores[0] if valid_stores else None
+    print(f"Filtered {product_stats['total']} to {num_products} valid products ({product_stats['invalid']} invalid)")
+    print(f"Filtered {store_index.total} to {len(store_index.stores)} valid stores ({store_index.total - len(store_index.stores)} invalid)")
+    if store_filter:
+        print(f"Selected {len(valid_stores)} stores matching {store_filter}")
 
     # Calculate expected results
-    total_combinations = len(valid_products) * len(valid_stores)
-    print(f"🚀 Total combinations to process: {total_combinations:,} ({len(valid_products):,} products × {len(valid_stores)} stores)")
+    total_combinations = num_products * len(valid_stores)
+    print(f"🚀 Total combinations to process: {total_combinations:,} ({num_products:,} products × {len(valid_stores)} stores)")
 
-    headers = ['name', 'brand', 'url', 'mainImageurl', 'SKU', 'Reviews', 'Rating', 'Model', 'retailer', 'storesku', 'omsid','storeName','storeID','storeLocation','inventory']
-    csv_file = f'product-{datetime.now().strftime("%Y-%m-%d")}.csv'
     results_folder = os.path.join(lowes.root_dir, 'results')
 
     if not os.path.exists(results_folder):
         os.makedirs(results_folder)
 
-    with open(f'{results_folder}/{csv_file}', 'w', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(headers)
-
-    # Optimized concurrency configuration for token reuse
-    NUM_WORKERS = 10  # Number of concurrent workers
-    REQUESTS_PER_MINUTE = 60  # Per worker rate limit
+    # Each shard keeps its own journal and output file
+    suffix = shard_suffix(shard)
+    if shard:
+        print(f"Running shard {shard[0]} of {shard[1]}")
+
+    # Progress journal: a fresh run starts it over, --resume continues the previous run
+    journal = ProgressJournal(os.path.join(results_folder, f'progress{suffix}.sqlite'))
+    if resume and journal.get_meta('run_date'):
+        run_date = journal.get_meta('run_date')
+        output_format = journal.get_meta('output_format', output_format)
+        print(f"Resuming run from {run_date}: {journal.counts()}")
+    else:
+        resume = False
+        run_date = run_date or datetime.now().strftime("%Y-%m-%d")
+        journal.reset(run_date=run_date, output_format=output_format)
+
+    if output_format == 'parquet':
+        sink = ParquetSink(os.path.join(results_folder, 'parquet'), run_date)
+    elif output_format == 'normalized':
+        sink = NormalizedCSVSink(
+            os.path.join(results_folder, f'products-{run_date}{suffix}.csv'),
+            os.path.join(results_folder, f'inventory-{run_date}{suffix}.csv'),
+            mode='a' if resume else 'w'
+        )
+    else:
+        sink = CSVSink(os.path.join(results_folder, f'product-{run_date}{suffix}.csv'), mode='a' if resume else 'w')
+
+    # Incremental runs rescan a pair once it has probably changed since its last scan
+    tracker = None
+    if incremental:
+        tracker = VolatilityTracker(history_path(results_folder, incremental), max_interval=max_interval, threshold=change_threshold)
+        for date, rows in tracker.ingest(results_folder, run_date):
+            print(f"Loaded {rows:,} results from the {date} run into the volatility history")
+        if budget:
+            # Every shard fits the whole matrix to the whole budget, so they agree on the threshold
+            tracker.fit_budget(budget, total_combinations)
+        print(tracker.summary())
+        stable_stores = functools.lru_cache(maxsize=4096)(tracker.stable_stores)
+
+    def journal_written(keys):
+        # Committed with each written batch, so rows on disk are never left unjournaled
+        journal.record_many(keys, 'ok')
+        journal.flush()
+
+    # Single writer stage owns the output, workers only enqueue rows
+    result_writer = ResultWriter(sink, on_flush=journal_written)
+    await result_writer.start()
+
+    # Concurrency configuration
+    MAX_CONCURRENCY = 200  # Upper bound for in-flight requests
     TOKEN_VALIDITY_MINUTES = 15
-    GLOBAL_CONCURRENCY_LIMIT = 200  # Overall concurrent requests
-
-    # Distribute products among workers to ensure concurrent processing
-    global_semaphore = asyncio.Semaphore(GLOBAL_CONCURRENCY_LIMIT)
-    write_lock = asyncio.Lock()
+    TOKEN_POOL_SIZE = 5  # Tokens shared by all workers
+
+    # Concurrency and request rate adapt to upstream latency and 429/503/504 responses
+    # Shards on the same box share one request budget through a lock file
+    shared_limiter = SharedRateLimiter(os.path.join(results_folder, 'rate.lock'), shared_rate) if shared_rate else None
+    if lowes.controller is None:
+        lowes.controller = AdaptiveController(concurrency=10, max_concurrency=MAX_CONCURRENCY, rate=10.0, shared_limiter=shared_limiter)
+    controller = lowes.controller
+    NUM_WORKERS = int(controller.max_concurrency)  # Worker coroutines are cheap, the controller decides how many run
+
+    # One shared session/connector for tokens and product requests
+    await lowes.open_session()
+
+    # Tokens are fetched and refreshed in the background, workers only borrow them
+    broker = TokenBroker(lowes, pool_size=TOKEN_POOL_SIZE, validity_minutes=TOKEN_VALIDITY_MINUTES)
+    await broker.start()
+
+    # Stores already finished in an interrupted run are skipped, looked up once per product
+    completed_stores = functools.lru_cache(maxsize=4096)(journal.completed_stores)
+
+    def base_skip(product, store):
+        # Jobs owned by other shards, then pairs finished before a restart
+        if shard and shard_of(product.omsid, store.store_id, shard[1]) != shard[0]:
+            return True
+        # Pairs that are unlikely to have changed wait for a later run
+        if tracker is not None and store.store_id in stable_stores(product.omsid):
+            return True
+        return resume and store.store_id in completed_stores(product.omsid)
+
+    # Sampling runs only scan a stratified sample of the stores for each product
+    sampling = None
+    if sample_fraction:
+        stores_by_id = {store.store_id: store for store in valid_stores}
+        strata = {store_id: stratum for store_id, stratum in store_index.strata(stratify).items() if store_id in stores_by_id}
+        sampling = SamplingEstimator(StratifiedSample(strata, sample_fraction, min_per_stratum), confidence, escalate_width)
+        estimates_path = os.path.join(results_folder, f'estimates-{run_date}{suffix}.jsonl')
+        print(f"Sampling {sample_fraction:.1%} of the stores per {stratify} (at least {min_per_stratum} each) for every product")
+
+    def skip(product, store):
+        if base_skip(product, store):
+            return True
+        if sampling is None:
+            return False
+        sampled = sampling.sampled_stores(product, lambda store_id: not base_skip(product, stores_by_id[store_id]))
+        return store.store_id not in sampled
+
+    def escalate(product):
+        # The sample left the in-stock ratio too uncertain: queue the rest of the stores for this product.
+        # The generator skips every store outside the sample, so each of these is scanned once
+        sampled = sampling.sampled_stores(product, None)
+        extra = [store for store in valid_stores if store.store_id not in sampled and not base_skip(product, store)]
+        for store in extra:
+            scheduler.add(product, store)
+        sampling.escalate(product, [store.store_id for store in extra])
+        log.info('Escalating %s to %d more stores', product.sku, len(extra), extra={'omsid': product.omsid})
+
+    def write_estimates():
+        # Estimates are a by-product, a failure here must not abort the run
+        try:
+            lines = sampling.snapshot()
+            if lines:
+                with open(estimates_path, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+        except Exception as e:
+            log.error('Could not write estimates to %s: %s', estimates_path, e, exc_info=True)
+
+    async def report_estimates(interval):
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(write_estimates)
+
+    # Product-major walks the products once, so they are streamed from the file; other orders revisit them
+    valid_products = lowes.iter_products(products_file) if order == 'product-major' else lowes.load_products(products_file)
+
+    # Workers pull (product, store) jobs from one scheduler instead of fixed product slices
+    scheduler = JobScheduler(valid_products, valid_stores, NUM_WORKERS, chunk_size=chunk_size, order=order, skip=skip)
+
+    # 401s per job that is still being retried
+    auth_failures = {}
 
     async def worker(worker_id):
-        """Worker with token reuse across multiple products"""
-        print(f"Worker {worker_id}: Starting")
-        request_times = deque(maxlen=REQUESTS_PER_MINUTE)  # Track request timestamps
-
-        async with aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=30),
-            connector=aiohttp.TCPConnector(limit=50)  # Per-worker connection limit
-        ) as session:
-            print(f"Worker {worker_id}: Session created, processing {len(valid_products[worker_id::NUM_WORKERS])} products")
-
-            # Initialize token and headers (reused across multiple products)
-            token = None
-            headers = None
-            token_start_time = 0
-            products_processed_with_token = 0
-
-            # Get products assigned to this worker
-            worker_products = valid_products[worker_id::NUM_WORKERS]
-
-            for product in worker_products:
-                # Process this product at all stores
-                for store in valid_stores:
-                    # Rate limiting: ensure we don't exceed per-minute limit
-                    now = time.time()
-                    if len(request_times) >= REQUESTS_PER_MINUTE:
-                        # Calculate time to wait to maintain rate limit
-                        oldest_request = request_times[0]
-                        time_since_oldest = now - oldest_request
-                        if time_since_oldest < 60:  # Within 1 minute window
-                            sleep_time = 60 - time_since_oldest
-                            await asyncio.sleep(sleep_time)
-
-                    # Token management: get new token if needed or expired
-                    if (token is None or
-                        (now - token_start_time) > (TOKEN_VALIDITY_MINUTES * 60) or
-                        products_processed_with_token >= 100):  # Refresh after 100 products
-
-                        # Get new token
-                        device_id = str(uuid.uuid4()).upper()
-                        headers = lowes.headers.copy()
-                        headers.update({
-                            'deviceid': device_id,
-                            'epid': str(uuid.uuid4()).upper(),
-                            'adid': lowes.generate_sensor_data(type="random_number"),
-                            'x-lowes-uuid': f'ca829819-f33a-44c5-b294-{lowes.generate_sensor_data(type="random_string")}',
-                            'x-acf-sensor-data': lowes.generate_sensor_data(type="sensor_data"),
-                        })
-
-                        success_token, new_token, _ = await lowes.get_token_async(headers, worker_id, delay=0.1, timeout=30)
-                        if not success_token:
-                            print(f'Worker {worker_id}: Failed to get token for {product["SKU"]}, skipping')
-                            continue
-
-                        token = new_token
-                        token_start_time = now
-                        products_processed_with_token = 0
-
-                    # Global concurrency control
-                    async with global_semaphore:
-                        try:
-                            # Call scan_items_async with provided headers and token
-                            success, result = await lowes.scan_items_async(
-                                session, store, product, headers, token, delay=0.1, timeout=30
-                            )
-
-                            # Record request time for rate limiting
-                            request_times.append(time.time())
-                            products_processed_with_token += 1
-
-                            if success:
-                                # Save successful result
-                                async with write_lock:
-                                    with open(f'{results_folder}/{csv_file}', 'a', encoding='utf-8', newline='') as f:
-                                        writer = csv.writer(f)
-                                        writer.writerow(result['data'].values())
-                            else:
-                                # Handle API errors
-                                if isinstance(result, dict) and result.get('status') == 401:
-                                    # Token expired - will refresh on next iteration
-                                    print(f'Worker {worker_id}: Token expired, will refresh')
-                                    token = None  # Force token refresh
-                                else:
-                                    # Handle both dict and string result types
-                                    if isinstance(result, dict):
-                                        error_msg = result.get('message', str(result))
-                                    else:
-                                        error_msg = str(result)
-                                    print(f'Worker {worker_id}: API error for {product["SKU"]} at {store["store_name"]}: {error_msg}')
-
-                        except Exception as e:
-                            print(f'Worker {worker_id}: Exception processing {product["SKU"]} at {store["store_name"]}: {e}')
+        """Worker pulling jobs from the shared scheduler"""
+
+        # All workers share the connection pool owned by the LOWES instance
+        session = lowes.session
+
+        while result_writer.error is None and broker.error is None:
+            job = await scheduler.next_job(worker_id)
+            if job is None:
+                break
+            product, store, attempt = job
+            key = (product.omsid, store.store_id)
+            deferred = False
+
+            # Concurrency and rate are enforced by the controller inside the request
+            try:
+                # The token is borrowed from the broker once the controller grants a request slot
+                success, result = await lowes.scan_items_async(
+                    session, store, product, broker.acquire, delay=0.1, timeout=30
+                )
+
+                if success:
+                    # Hand the row to the writer stage, it is journaled once written
+                    await result_writer.put(result['data'], key=(product.omsid, store.store_id))
+                    metrics.results.inc(outcome='ok')
+                    if sampling is not None and sampling.observe(product, store.store_id, float(result['data']['inventory'] or 0)):
+                        escalate(product)
+                elif result == 'Not Available':
+                    journal.record(product.omsid, store.store_id, 'not_found')
+                    metrics.results.inc(outcome='not_found')
+                    if sampling is not None and sampling.observe(product, store.store_id, 0):
+                        escalate(product)
+                else:
+                    kind = result.get('kind', PERMANENT) if isinstance(result, dict) else PERMANENT
+                    error_msg = result.get('message', str(result)) if isinstance(result, dict) else str(result)
+
+                    if kind == AUTH:
+                        # Token expired - drop it from the pool, the broker replaces it
+                        log.debug('Worker %d: token expired, invalidating', worker_id)
+                        broker.invalidate(result.get('token'))
+                        # 401s have their own budget and don't use up the job's attempts
+                        auth_failures[key] = auth_failures.get(key, 0) + 1
+                        retry = lowes.retry_policy.should_retry(kind, auth_failures[key])
+                    else:
+                        retry = lowes.retry_policy.should_retry(kind, attempt + 1)
+
+                    if retry:
+                        # Retry later without holding a worker or a request slot
+                        delay = 0 if kind == AUTH else lowes.retry_policy.backoff(attempt)
+                        scheduler.defer(job, delay, count=kind != AUTH)
+                        deferred = True
+                        metrics.retries.inc(kind=kind)
+                    else:
+                        journal.record(product.omsid, store.store_id, 'error')
+                        metrics.results.inc(outcome='error')
+                        if sampling is not None and sampling.drop(product, store.store_id):
+                            escalate(product)
+                        log.warning('API error for %s at %s: %s', product.sku, store.store_name, error_msg,
+                                    extra={'omsid': product.omsid, 'store_id': store.store_id, 'kind': kind, 'worker': worker_id})
+
+            except WriterError:
+                # Output can't be written anymore, stop instead of scanning into the void
+                break
+
+            except Exception as e:
+                journal.record(product.omsid, store.store_id, 'error')
+                metrics.results.inc(outcome='error')
+                if sampling is not None and sampling.drop(product, store.store_id):
+                    escalate(product)
+                log.error('Exception processing %s at %s: %s', product.sku, store.store_name, e, exc_info=True,
+                          extra={'omsid': product.omsid, 'store_id': store.store_id, 'worker': worker_id})
+
+            finally:
+                if not deferred:
+                    auth_failures.pop(key, None)
+                scheduler.task_done()
+
+    # Queue depths and limits are read when scraped or summarised
+    metrics = lowes.metrics
+    metrics.gauge('lowes_writer_queue_rows', 'Rows waiting for the writer (writer lag)', result_writer.queue.qsize)
+    metrics.gauge('lowes_retry_queue_jobs', 'Jobs waiting out their retry backoff', lambda: len(scheduler.retries))
+    metrics.gauge('lowes_inflight_requests', 'Product requests in flight', lambda: controller.inflight)
+    metrics.gauge('lowes_concurrency_limit', 'Current adaptive concurrency limit', lambda: int(controller.concurrency))
+    metrics.gauge('lowes_routes_open', 'Routes with an open or half-open circuit breaker', lowes.routes.open_count)
+    if metrics_port:
+        # Shards on one machine get consecutive ports
+        await metrics.serve(metrics_port + (shard[0] if shard else 0))
+    if summary_interval:
+        metrics.start_reporting(summary_interval)
+    # Running estimates are appended as they move, final ones once the run ends
+    estimates_task = asyncio.create_task(report_estimates(summary_interval or 10)) if sampling is not None else None
 
     # Create and run workers
-    print(f"Starting {NUM_WORKERS} workers with distributed products...")
+    print(f"Starting {NUM_WORKERS} workers ({order}, chunks of {chunk_size})...")
     workers = []
     for i in range(NUM_WORKERS):
         task = asyncio.create_task(worker(i))
         workers.append(task)
 
-    # Wait for all workers to complete
-    await asyncio.gather(*workers, return_exceptions=True)
+    try:
+        # Wait for all workers to complete
+        await asyncio.gather(*workers, return_exceptions=True)
+    finally:
+        # Also runs on Ctrl-C: queued rows are written and journaled, so --resume doesn't append them again
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if estimates_task is not None:
+            estimates_task.cancel()
+            await asyncio.gather(estimates_task, return_exceptions=True)
+            write_estimates()
+        await broker.close()
+        try:
+            await result_writer.close()
+        finally:
+            journal.close()
+            if tracker is not None:
+                tracker.close()
+            await lowes.close_session()
+            await metrics.close()
+
+    print(scheduler.summary())
+    print(controller.summary())
+    print(lowes.product_cache.summary())
+    if sampling is not None:
+        print(sampling.summary())
+        print(f"Estimates written to {estimates_path}")
+    print(lowes.pool.stats.summary())
+    print(lowes.routes.summary())
+    print(metrics.summary())
+
+    error = broker.error or result_writer.error
+    if error is not None:
+        # Workers stopped without tokens or output; what was written is journaled, --resume picks up the rest
+        if owns_logging:
+            jsonlog.shutdown_logging()
+        raise error
+
+    # Change feed against the previous run; sharded runs diff the merged output instead.
+    # Pairs an incremental run skipped are missing from its output, not removed, and compared with their last scan
+    if changes and not shard and output_format != 'parquet':
+        diff_runs(results_folder, run_date, changes, removals=not incremental, history=history_path(results_folder, incremental))
 
     # All tasks completed
 
     print("All combinations processed!")
+    if owns_logging:
+        jsonlog.shutdown_logging()
     return total_combinations
 
 
+def history_path(results_folder, incremental):
+    return os.path.join(results_folder, 'volatility.sqlite') if incremental else None
+
+
+def merge_outputs(output_format, run_date):
+    results_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+    if output_format == 'normalized':
+        merge_shards(results_folder, run_date, key=('omsid',), prefix='products')
+        merge_shards(results_folder, run_date, prefix='inventory')
+    elif output_format == 'csv':
+        merge_shards(results_folder, run_date)
+
+
+def run_shards(args, argv):
+    """Run the matrix as N local shard processes, then merge their outputs"""
+    run_date = args.run_date or datetime.now().strftime("%Y-%m-%d")
+    processes = []
+    for index in range(args.processes):
+        command = [sys.executable, os.path.abspath(__file__), *argv, '--shard', f'{index}/{args.processes}', '--run-date', run_date]
+        processes.append(subprocess.Popen(command))
+
+    failed = [index for index, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        print(f"Shards {failed} exited with errors, rerun them with --shard <index>/{args.processes} --resume before merging")
+        return
+
+    merge_outputs(args.format, run_date)
+    if args.changes and args.format != 'parquet':
+        results_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+        diff_runs(results_folder, run_date, args.changes, removals=not args.incremental, history=history_path(results_folder, args.incremental))
+
+
+def parse_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_point(value):
+    try:
+        lat, lon = (float(part) for part in value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected <lat>,<long>')
+    return (lat, lon)
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Lowes store inventory scraper')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'normalized'], default='csv',
+                        help='Output format; normalized writes a products CSV once per product and a slim inventory CSV')
+    parser.add_argument('--resume', action='store_true', help='Continue the previous run, skipping finished pairs')
+    parser.add_argument('--chunk-size', type=int, default=50, help='Jobs handed to a worker at a time')
+    parser.add_argument('--order', choices=ORDERS, default='product-major', help='Order in which product x store jobs are generated')
+    parser.add_argument('--shard', type=parse_shard, help='Only scan the <index>/<count> share of the matrix (e.g. 0/4)')
+    parser.add_argument('--processes', type=int, default=1, help='Split the run across this many local shard processes')
+    parser.add_argument('--shared-rate', type=float, help='Requests per second shared by all shards on this machine')
+    parser.add_argument('--run-date', help='Run date used in output names (defaults to today)')
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this local port')
+    parser.add_argument('--summary-interval', type=float, default=30, help='Seconds between one-line progress summaries (0 to disable)')
+    parser.add_argument('--incremental', action='store_true', help='Only rescan pairs likely to have changed since previous runs')
+    parser.add_argument('--max-interval', type=int, default=7, help='Runs after which a stable pair is rescanned anyway (--incremental)')
+    parser.add_argument('--change-threshold', type=float, default=0.5, help='Rescan pairs whose chance of having changed is at least this (--incremental)')
+    parser.add_argument('--budget', type=int, help='Pairs to scan per run, adjusts --change-threshold to fit (--incremental)')
+    parser.add_argument('--changes', choices=CHANGE_FORMATS, help='After the run, write a change feed against the previous run (CSV outputs)')
+    parser.add_argument('--states', type=parse_list, help='Only scan stores in these states (e.g. WA,OR)')
+    parser.add_argument('--regions', type=parse_list, help='Only scan stores in these region numbers')
+    parser.add_argument('--areas', type=parse_list, help='Only scan stores in these area numbers')
+    parser.add_argument('--near', type=parse_point, metavar='LAT,LONG', help='Only scan stores within --radius miles of this point')
+    parser.add_argument('--near-zip', help='Only scan stores within --radius miles of this zip code')
+    parser.add_argument('--radius', type=float, default=25, help='Radius in miles for --near/--near-zip')
+    parser.add_argument('--sample', type=float, metavar='FRACTION', help='Only scan this fraction of the stores per product and estimate the rest')
+    parser.add_argument('--stratify', choices=['state', 'region'], default='state', help='Strata the --sample is drawn from')
+    parser.add_argument('--min-per-stratum', type=int, default=1, help='Stores sampled from every stratum at least (--sample)')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the estimate intervals (--sample)')
+    parser.add_argument('--escalate-width', type=float, help='Scan every store for products whose in-stock ratio is still wider than +/- this (--sample)')
+    parser.add_argument('-v', '--verbose', action='count', default=0, help='Print every result and per-job error')
+    parser.add_argument('--merge', nargs='?', const='', metavar='DATE', help='Merge shard CSVs of --format for DATE (default today) and exit')
+    args = parser.parse_args()
+
+    if args.merge is not None:
+        merge_outputs(args.format, args.merge or datetime.now().strftime("%Y-%m-%d"))
+        return
+
+    if args.processes > 1 and args.shard is None:
+        # Children get the same options minus --processes
+        argv = []
+        skip_next = False
+        for arg in sys.argv[1:]:
+            if skip_next:
+                skip_next = False
+            elif arg == '--processes':
+                skip_next = True
+            elif not arg.startswith('--processes='):
+                argv.append(arg)
+        run_shards(args, argv)
+        return
+
+    store_filter = {'states': args.states, 'regions': args.regions, 'areas': args.areas, 'near': args.near, 'near_zip': args.near_zip}
+    store_filter = {key: value for key, value in store_filter.items() if value}
+    if 'near' in store_filter or 'near_zip' in store_filter:
+        store_filter['radius_miles'] = args.radius
+
     print("Starting optimized Lowes scraper...")
-    total_processed = asyncio.run(main_async())
+    total_processed = asyncio.run(main_async(
+        output_format=args.format, resume=args.resume, chunk_size=args.chunk_size, order=args.order,
+        shard=args.shard, shared_rate=args.shared_rate, run_date=args.run_date,
+        verbose=args.verbose, metrics_port=args.metrics_port, summary_interval=args.summary_interval,
+        store_filter=store_filter, incremental=args.incremental, max_interval=args.max_interval,
+        change_threshold=args.change_threshold, budget=args.budget, changes=args.changes,
+        sample_fraction=args.sample, stratify=args.stratify, min_per_stratum=args.min_per_stratum,
+        confidence=args.confidence, escalate_width=args.escalate_width
+    ))
     print(f"Scraper completed. Processed {total_processed} product-store combinations.")
 
 
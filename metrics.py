@@ -0,0 +1,167 @@
+import asyncio, bisect, time
+
+
+"""
+In-process metrics: counters, gauges and latency histograms, served in
+Prometheus text format and summarised in a periodic one-line log
+"""
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _key(labels):
+    # Label values are kept as strings so mixed statuses (200, 'timeout') sort together
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+class Counter():
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(_key(labels), 0)
+
+    def total(self):
+        return sum(self.values.values())
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        lines.extend(f'{self.name}{_labels(key)} {value}' for key, value in sorted(self.values.items()))
+        return lines
+
+
+class Gauge():
+    """Read from a callable at scrape time, so nothing has to update it"""
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge', f'{self.name} {self.read()}']
+
+
+class Histogram():
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = _key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+        series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def quantile(self, q, **labels):
+        """Estimate from bucket counts (upper bound of the bucket holding the quantile)"""
+        series = self.series.get(_key(labels))
+        if not series or not series['count']:
+            return 0.0
+        rank = q * series['count']
+        seen = 0
+        for index, count in enumerate(series['counts']):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series['counts']):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(key + (("le", bound),))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(key)} {series["sum"]}')
+            lines.append(f'{self.name}_count{_labels(key)} {series["count"]}')
+        return lines
+
+
+class Metrics():
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = Counter('lowes_requests_total', 'HTTP requests sent, by endpoint')
+        self.responses = Counter('lowes_responses_total', 'HTTP responses received, by endpoint and status')
+        self.results = Counter('lowes_results_total', 'Finished product x store jobs, by outcome')
+        self.retries = Counter('lowes_retries_total', 'Jobs deferred for another attempt, by error kind')
+        self.latency = Histogram('lowes_request_latency_seconds', 'Request latency, by endpoint')
+        self.token_refresh = Histogram('lowes_token_refresh_seconds', 'Time to fetch a new token')
+        self.gauges = []
+        self.server = None
+        self.reporter = None
+
+    def gauge(self, name, help, read):
+        self.gauges.append(Gauge(name, help, read))
+
+    def observe_request(self, endpoint, status, latency):
+        self.requests.inc(endpoint=endpoint)
+        self.responses.inc(endpoint=endpoint, status=status)
+        self.latency.observe(latency, endpoint=endpoint)
+
+    def render(self):
+        lines = []
+        for metric in (self.requests, self.responses, self.results, self.retries, self.latency, self.token_refresh, *self.gauges):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        product_requests = self.requests.get(endpoint='product')
+        gauges = ' '.join(f'{g.name.replace("lowes_", "")}={g.read()}' for g in self.gauges)
+        return (f"[metrics] {product_requests / elapsed:.1f} req/s | "
+                f"ok {self.results.get(outcome='ok')} not_found {self.results.get(outcome='not_found')} "
+                f"error {self.results.get(outcome='error')} retries {self.retries.total()} | "
+                f"401 {self.responses.get(endpoint='product', status=401)} 429 {self.responses.get(endpoint='product', status=429)} | "
+                f"p50 {self.latency.quantile(0.5, endpoint='product')}s p99 {self.latency.quantile(0.99, endpoint='product')}s | "
+                f"{gauges}")
+
+    async def _handle(self, reader, writer):
+        try:
+            # Request line and headers are ignored, every path returns the metrics
+            await reader.readuntil(b'\r\n\r\n')
+            body = self.render().encode('utf-8')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                         + f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('ascii') + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, port, host='127.0.0.1'):
+        self.server = await asyncio.start_server(self._handle, host, port)
+        print(f"Metrics available at http://{host}:{port}/metrics")
+
+    async def _report(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            print(self.summary())
+
+    def start_reporting(self, interval):
+        self.reporter = asyncio.create_task(self._report(interval))
+
+    async def close(self):
+        if self.reporter is not None:
+            self.reporter.cancel()
+            await asyncio.gather(self.reporter, return_exceptions=True)
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
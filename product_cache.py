@@ -0,0 +1,45 @@
+import time
+from collections import OrderedDict
+
+
+"""
+Product metadata cache keyed by omsid.
+Name, brand, URL, image, model, rating and reviews are the same in every store,
+so they are formatted once per product and reused until the entry expires.
+Expired entries are dropped when looked up, and the least recently used product
+is evicted once maxsize is reached, so long runs over many products stay bounded.
+"""
+
+
+class ProductCache():
+    def __init__(self, ttl=3600, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # omsid -> (expires_at, metadata), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, omsid):
+        entry = self.entries.get(omsid)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.entries.move_to_end(omsid)
+                self.hits += 1
+                return entry[1]
+            del self.entries[omsid]
+        self.misses += 1
+        return None
+
+    def put(self, omsid, metadata):
+        self.entries[omsid] = (time.monotonic() + self.ttl, metadata)
+        self.entries.move_to_end(omsid)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        hit_ratio = self.hits / lookups if lookups else 0.0
+        return (f"Product cache: {len(self.entries)} products, {self.hits} hits, {self.misses} misses "
+                f"({hit_ratio:.1%} hit ratio), {self.evictions} evicted")
@@ -0,0 +1,69 @@
+import asyncio, heapq, itertools, random, time
+import aiohttp
+
+
+"""
+Retry policy (error classification + backoff) and the deferred retry queue
+"""
+
+RETRYABLE = 'retryable'
+PERMANENT = 'permanent'
+AUTH = 'auth'
+
+
+class RetryPolicy():
+    def __init__(self, max_attempts=4, max_auth_attempts=10, base_delay=0.5, max_delay=30.0,
+                 retry_statuses=(408, 429, 500, 502, 503, 504), auth_statuses=(401,)):
+        self.max_attempts = max_attempts
+        # 401s are the token's fault, not the job's, so they are counted apart
+        self.max_auth_attempts = max_auth_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = set(retry_statuses)
+        self.auth_statuses = set(auth_statuses)
+
+    def classify(self, status=None, error=None):
+        if error is not None:
+            # Network, proxy and timeout errors are worth another try on another route
+            if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+                return RETRYABLE
+            return PERMANENT
+        if status in self.auth_statuses:
+            return AUTH
+        if status in self.retry_statuses:
+            return RETRYABLE
+        return PERMANENT
+
+    def should_retry(self, kind, attempt):
+        """attempt is the number of attempts already made, for AUTH the number of 401s"""
+        if kind == AUTH:
+            return attempt < self.max_auth_attempts
+        return kind == RETRYABLE and attempt < self.max_attempts
+
+    def backoff(self, attempt):
+        # Exponential backoff with full jitter so retries don't arrive in bursts
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class DeferredRetryQueue():
+    """Jobs waiting out their backoff, ordered by the time they become due"""
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, item, delay):
+        heapq.heappush(self.heap, (time.monotonic() + delay, next(self.counter), item))
+
+    def pop_due(self):
+        if self.heap and self.heap[0][0] <= time.monotonic():
+            return heapq.heappop(self.heap)[2]
+        return None
+
+    def next_due_in(self):
+        if not self.heap:
+            return None
+        return max(0.0, self.heap[0][0] - time.monotonic())
@@ -0,0 +1,126 @@
+import random, time
+
+
+"""
+Health scoring and circuit breakers for egress routes (proxies)
+"""
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Responses that say the route itself is blocked or throttled
+ROUTE_FAILURE_STATUSES = {403, 407, 429}
+
+
+def proxy_url_of(proxy):
+    if isinstance(proxy, str) and proxy.startswith('http'):
+        return proxy
+    if isinstance(proxy, dict):
+        return proxy.get('http') or proxy.get('https')
+    return None
+
+
+class Route():
+    def __init__(self, proxy_url, failure_threshold=5, open_seconds=30, max_open_seconds=600, alpha=0.1):
+        self.proxy_url = proxy_url
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.alpha = alpha
+
+        self.state = CLOSED
+        self.success_rate = 1.0
+        self.latency = None
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.open_for = open_seconds
+        self.probing = False
+        self.trips = 0
+
+    def available(self, now):
+        if self.state == OPEN and now - self.opened_at >= self.open_for:
+            # Cool-down over, let one probe request through
+            self.state = HALF_OPEN
+            self.probing = False
+        if self.state == HALF_OPEN:
+            return not self.probing
+        return self.state == CLOSED
+
+    def weight(self):
+        # Favour routes that succeed and answer quickly; untested routes get a neutral latency
+        latency = self.latency if self.latency is not None else 1.0
+        return (self.success_rate ** 2) / max(latency, 0.05) + 1e-6
+
+    def record(self, ok, latency):
+        self.samples += 1
+        self.success_rate += self.alpha * ((1.0 if ok else 0.0) - self.success_rate)
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+
+        if ok:
+            self.consecutive_failures = 0
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self.open_for = self.open_seconds
+                self.success_rate = max(self.success_rate, 0.5)
+            self.probing = False
+            return
+
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN:
+            # Probe failed: stay out longer each time
+            self._trip(min(self.open_for * 2, self.max_open_seconds))
+        elif self.consecutive_failures >= self.failure_threshold or (self.samples >= 20 and self.success_rate < 0.25):
+            self._trip(self.open_seconds)
+
+    def _trip(self, open_for):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.open_for = open_for
+        self.probing = False
+        self.trips += 1
+
+
+class RouteSelector():
+    def __init__(self, proxies, **route_options):
+        urls = [proxy_url_of(proxy) for proxy in (proxies or [])]
+        self.routes = [Route(url, **route_options) for url in urls if url]
+
+    def pick(self):
+        """Weighted pick among usable routes, None means a direct connection"""
+        if not self.routes:
+            return None
+
+        now = time.monotonic()
+        candidates = [route for route in self.routes if route.available(now)]
+        if not candidates:
+            # Every breaker is open: use the one closest to reopening rather than stalling
+            route = min(self.routes, key=lambda r: r.opened_at + r.open_for)
+        else:
+            route = random.choices(candidates, weights=[route.weight() for route in candidates])[0]
+
+        if route.state == HALF_OPEN:
+            route.probing = True
+        return route
+
+    def release(self, route):
+        """Return a pick that ended without a verdict, so a half-open route can be probed again"""
+        if route is not None and route.state == HALF_OPEN:
+            route.probing = False
+
+    def report(self, route, status=None, latency=None, error=None):
+        if route is None:
+            return
+        ok = error is None and status not in ROUTE_FAILURE_STATUSES
+        route.record(ok, latency if ok else None)
+
+    def open_count(self):
+        return sum(1 for route in self.routes if route.state != CLOSED)
+
+    def summary(self):
+        if not self.routes:
+            return "routes: direct connection"
+        return (f"routes: {len(self.routes)} configured, {self.open_count()} open/half-open, "
+                f"{sum(route.trips for route in self.routes)} breaker trips")
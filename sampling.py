@@ -0,0 +1,194 @@
+import json, math, random, statistics, time
+
+
+"""
+Sampling run mode: a stratified random sample of stores per product, with running
+estimates of the in-stock ratio and the national quantity as results arrive.
+Products whose in-stock ratio is still too uncertain once their sample is in can be
+escalated to every store.
+"""
+
+
+class StratifiedSample():
+    """Per-product store sample, proportional to each stratum (state or region) with a floor"""
+
+    def __init__(self, strata, fraction, min_per_stratum=1, seed=0):
+        self.strata = strata  # store_id -> stratum
+        self.fraction = fraction
+        self.min_per_stratum = min_per_stratum
+        self.seed = seed
+
+        self.members = {}
+        for store_id, stratum in strata.items():
+            self.members.setdefault(stratum, []).append(store_id)
+        for store_ids in self.members.values():
+            store_ids.sort()
+        self.sizes = {stratum: len(store_ids) for stratum, store_ids in self.members.items()}
+
+    def stores_for(self, omsid):
+        # Seeded by product so a resumed run draws the same sample
+        rnd = random.Random(f'{self.seed}:{omsid}')
+        chosen = []
+        for stratum in sorted(self.members):
+            store_ids = self.members[stratum]
+            n = min(len(store_ids), max(self.min_per_stratum, math.ceil(self.fraction * len(store_ids))))
+            chosen.extend(rnd.sample(store_ids, n))
+        return chosen
+
+
+class ProductEstimate():
+    def __init__(self, product):
+        self.product = product
+        self.sample = frozenset()  # drawn once, what the job generator scans
+        self.expected = set()  # results awaited: the sample, plus the other stores once escalated
+        self.resolved = 0
+        self.stats = {}  # stratum -> [n, in_stock, qty_sum, qty_sumsq]
+        self.escalated = False
+        self.final = False
+
+    def observe(self, stratum, qty):
+        stats = self.stats.setdefault(stratum, [0, 0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += qty > 0
+        stats[2] += qty
+        stats[3] += qty * qty
+
+    def estimate(self, sizes, z):
+        """Stratified in-stock ratio (Wilson interval on the effective sample size) and national total"""
+        observed = {stratum: stats for stratum, stats in self.stats.items() if stats[0]}
+        if not observed:
+            return None
+        # Strata without a result yet are represented by the others
+        population = sum(sizes[stratum] for stratum in observed)
+        scale = sum(sizes.values()) / population
+
+        ratio = ratio_var = total = total_var = 0.0
+        sampled = 0
+        for stratum, (n, in_stock, qty_sum, qty_sumsq) in observed.items():
+            size = sizes[stratum]
+            weight = size / population
+            fpc = max(1 - n / size, 0.0)
+            p = in_stock / n
+            mean = qty_sum / n
+            ratio += weight * p
+            total += size * mean * scale
+            if n > 1:
+                ratio_var += weight ** 2 * fpc * p * (1 - p) / (n - 1)
+                total_var += (size * scale) ** 2 * fpc * max(qty_sumsq - n * mean * mean, 0.0) / (n - 1) / n
+            elif fpc > 0:
+                # A single store says nothing about spread, assume the worst case
+                ratio_var += weight ** 2 * fpc * 0.25
+            sampled += n
+
+        if ratio_var > 0 and 0 < ratio < 1:
+            effective_n = ratio * (1 - ratio) / ratio_var
+        else:
+            coverage = sampled / population
+            effective_n = sampled / (1 - coverage) if coverage < 1 else math.inf
+        total_se = math.sqrt(max(total_var, 0.0))
+        return {
+            'in_stock_ratio': round(ratio, 4),
+            'ratio_ci': [round(bound, 4) for bound in wilson_interval(ratio, effective_n, z)],
+            'total_qty': round(total, 1),
+            'total_ci': [round(max(total - z * total_se, 0.0), 1), round(total + z * total_se, 1)],
+            'sampled_stores': sampled,
+        }
+
+
+def wilson_interval(p, n, z):
+    if n == math.inf:
+        return p, p
+    if n <= 0:
+        return 0.0, 1.0
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(center - half, 0.0), min(center + half, 1.0)
+
+
+class SamplingEstimator():
+    """
+    Tracks the sample of every product and its running estimate.
+    observe/drop return True when a product's sample is complete but its in-stock ratio
+    interval is wider than escalate_width, the caller then adds the remaining stores.
+    """
+
+    def __init__(self, sample, confidence=0.95, escalate_width=None):
+        self.sample = sample
+        self.z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.confidence = confidence
+        self.escalate_width = escalate_width
+        self.products = {}
+        self.changed = set()
+        self.results = 0
+        self.escalations = 0
+
+    def sampled_stores(self, product, eligible):
+        """
+        Sampled store ids for a product; eligible(store_id) leaves out pairs skipped for other reasons.
+        The sample never grows, escalated stores are queued by the caller instead of generated.
+        """
+        estimate = self.products.get(product.omsid)
+        if estimate is None:
+            estimate = self.products[product.omsid] = ProductEstimate(product)
+            estimate.sample = frozenset(store_id for store_id in self.sample.stores_for(product.omsid) if eligible(store_id))
+            estimate.expected = set(estimate.sample)
+        return estimate.sample
+
+    def escalate(self, product, store_ids):
+        """Await results for store_ids too, the caller queues them; they must be outside the sample"""
+        estimate = self.products[product.omsid]
+        estimate.escalated = True
+        estimate.expected.update(store_ids)
+        self.escalations += 1
+        if estimate.resolved >= len(estimate.expected):
+            # Nothing left to add, the sample already was the full coverage
+            estimate.final = True
+        self.changed.add(product.omsid)
+
+    def observe(self, product, store_id, qty):
+        estimate = self.products[product.omsid]
+        estimate.observe(self.sample.strata[store_id], qty)
+        return self._resolved(estimate)
+
+    def drop(self, product, store_id):
+        # A pair that failed for good leaves the sample
+        return self._resolved(self.products[product.omsid])
+
+    def _resolved(self, estimate):
+        self.results += 1
+        estimate.resolved += 1
+        self.changed.add(estimate.product.omsid)
+        if estimate.resolved < len(estimate.expected):
+            return False
+        if not estimate.escalated and self.escalate_width is not None:
+            current = estimate.estimate(self.sample.sizes, self.z)
+            if current is None or (current['ratio_ci'][1] - current['ratio_ci'][0]) / 2 > self.escalate_width:
+                return True
+        estimate.final = True
+        return False
+
+    def snapshot(self):
+        """JSON lines for the products whose estimate moved since the last snapshot"""
+        lines = []
+        now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        for omsid in sorted(self.changed):
+            estimate = self.products[omsid]
+            current = estimate.estimate(self.sample.sizes, self.z)
+            if current is None:
+                continue
+            lines.append(json.dumps({
+                'ts': now, 'omsid': omsid, 'sku': estimate.product.sku,
+                'resolved': estimate.resolved, 'expected': len(estimate.expected),
+                **current,
+                'confidence': self.confidence, 'escalated': estimate.escalated, 'final': estimate.final,
+            }))
+        self.changed.clear()
+        return lines
+
+    def summary(self):
+        final = sum(1 for estimate in self.products.values() if estimate.final)
+        full = len(self.products) * len(self.sample.strata)
+        share = self.results / full if full else 0.0
+        return (f"sampling: {final}/{len(self.products)} products estimated from {self.results} results "
+                f"({share:.1%} of their full coverage), {self.escalations} escalated to every store")
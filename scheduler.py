@@ -0,0 +1,131 @@
+import asyncio, itertools
+from collections import deque
+from retry import DeferredRetryQueue
+
+
+"""
+Central job scheduler with per-worker queues, work stealing and deferred retries
+"""
+
+ORDERS = ['product-major', 'store-major', 'interleaved']
+
+
+class JobScheduler():
+    def __init__(self, products, stores, num_workers, chunk_size=50, order='product-major', skip=None):
+        if order not in ORDERS:
+            raise ValueError(f'Unknown job order {order}, expected one of {ORDERS}')
+        self.products = products
+        self.stores = stores
+        self.chunk_size = chunk_size
+        self.order = order
+        self.skip = skip
+
+        self.jobs = self._generate()
+        self.exhausted = False
+        self.local = [deque() for _ in range(num_workers)]
+        self.retries = DeferredRetryQueue()
+        self.added = deque()
+        self.outstanding = 0
+        self.changed = asyncio.Event()
+        self.dispatched = 0
+        self.skipped = 0
+        self.steals = 0
+        self.deferred = 0
+
+    def _generate(self):
+        # Jobs are produced lazily, the full product x store matrix is never built
+        if self.order == 'product-major':
+            pairs = ((product, store) for product in self.products for store in self.stores)
+        elif self.order == 'store-major':
+            pairs = ((product, store) for store in self.stores for product in self.products)
+        else:
+            # Diagonal walk: consecutive jobs hit different products and different stores
+            num_stores = len(self.stores)
+            pairs = (
+                (product, self.stores[(i + offset) % num_stores])
+                for offset in range(num_stores)
+                for i, product in enumerate(self.products)
+            )
+
+        for product, store in pairs:
+            if self.skip is not None and self.skip(product, store):
+                self.skipped += 1
+                continue
+            yield product, store
+
+    def _take_chunk(self):
+        if self.exhausted:
+            return []
+        chunk = list(itertools.islice(self.jobs, self.chunk_size))
+        if len(chunk) < self.chunk_size:
+            self.exhausted = True
+        return chunk
+
+    def _steal(self, worker_id):
+        # Take half of the busiest worker's remaining jobs from the back of its queue
+        victim = max(self.local, key=len)
+        if len(victim) < 2:
+            return False
+        own = self.local[worker_id]
+        for _ in range(len(victim) // 2):
+            own.appendleft(victim.pop())
+        self.steals += 1
+        return True
+
+    def _next_local(self, worker_id):
+        own = self.local[worker_id]
+        if not own:
+            chunk = self._take_chunk()
+            if chunk:
+                own.extend(chunk)
+            elif not self._steal(worker_id):
+                # Single leftover jobs are still worth taking
+                victim = max(self.local, key=len)
+                if not victim:
+                    return None
+                own.append(victim.pop())
+        product, store = own.popleft()
+        return product, store, 0
+
+    async def next_job(self, worker_id):
+        """
+        Next (product, store, attempt) job for a worker, or None once every job is finished.
+        Due retries go first; a worker with nothing to do waits for retries still in backoff.
+        """
+        while True:
+            job = self.retries.pop_due() or (self.added.popleft() if self.added else None) or self._next_local(worker_id)
+            if job is not None:
+                self.outstanding += 1
+                self.dispatched += 1
+                return job
+
+            # Jobs in flight may still come back as retries
+            if self.outstanding == 0 and not self.retries and not self.added:
+                self.changed.set()
+                return None
+
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout=self.retries.next_due_in())
+            except asyncio.TimeoutError:
+                pass
+
+    def defer(self, job, delay, count=True):
+        """Put a failed job back for another attempt after its backoff"""
+        product, store, attempt = job
+        self.retries.push((product, store, attempt + 1 if count else attempt), delay)
+        self.deferred += 1
+        self.changed.set()
+
+    def add(self, product, store):
+        """Queue an extra job outside the generated matrix, ahead of new chunks"""
+        self.added.append((product, store, 0))
+        self.changed.set()
+
+    def task_done(self):
+        self.outstanding -= 1
+        self.changed.set()
+
+    def summary(self):
+        return (f"scheduler: {self.dispatched} jobs dispatched, {self.skipped} skipped, {self.steals} steals, "
+                f"{self.deferred} retries deferred ({self.order}, chunk {self.chunk_size})")
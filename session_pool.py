@@ -0,0 +1,91 @@
+import asyncio, time, aiohttp
+
+
+"""
+Process-wide aiohttp session and connection pool
+"""
+
+class PoolStats():
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+
+    def reuse_ratio(self):
+        total = self.connections_created + self.connections_reused
+        return self.connections_reused / total if total else 0.0
+
+    def handshakes_per_minute(self):
+        minutes = max(time.monotonic() - self.started, 1) / 60
+        return self.connections_created / minutes
+
+    def summary(self):
+        return (f"pool: {self.requests} requests, {self.connections_created} new connections, "
+                f"{self.connections_reused} reused ({self.reuse_ratio():.1%}), "
+                f"{self.handshakes_per_minute():.1f} handshakes/min, "
+                f"dns {self.dns_hits} hits / {self.dns_misses} misses")
+
+
+class SessionPool():
+    def __init__(self, limit=200, limit_per_host=0, keepalive_timeout=60, dns_ttl=300, timeout=30):
+        # limit_per_host is applied per (host, port, ssl) key, and aiohttp keys
+        # pooled connections by proxy as well, so each route keeps its own idle sockets
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.timeout = timeout
+        self.stats = PoolStats()
+        self.session = None
+
+    def _trace_config(self):
+        trace = aiohttp.TraceConfig()
+        stats = self.stats
+
+        async def on_request_start(session, ctx, params):
+            stats.requests += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            stats.connections_created += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            stats.connections_reused += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            stats.dns_hits += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            stats.dns_misses += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace
+
+    async def open(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_ttl,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[self._trace_config()],
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+            # Give the connector a moment to close its transports
+            await asyncio.sleep(0.25)
+        self.session = None
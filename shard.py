@@ -0,0 +1,100 @@
+import asyncio, csv, fcntl, glob, os, struct, time, zlib
+from utils import Utils
+
+
+"""
+Sharded runs: deterministic job split, a cross-process rate limit and the merge step
+"""
+
+def parse_shard(value):
+    """'2/8' -> (2, 8)"""
+    index, count = (int(part) for part in value.split('/'))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f'Invalid shard {value}, expected <index>/<count> with 0 <= index < count')
+    return index, count
+
+
+def shard_of(omsid, store_id, count):
+    # crc32 is stable across processes and machines, unlike hash()
+    return zlib.crc32(f'{str(omsid).strip()}:{store_id}'.encode('utf-8')) % count
+
+
+def shard_suffix(shard):
+    return f'.shard-{shard[0]}-of-{shard[1]}' if shard else ''
+
+
+class SharedRateLimiter():
+    """
+    Token bucket stored in a small file and guarded with flock, so every shard
+    process on the box (or on hosts sharing a lock-capable filesystem) draws
+    from the same request budget. Tokens are taken in small batches to keep
+    lock traffic low.
+    """
+    STATE = struct.Struct('dd')
+
+    def __init__(self, path, rate, batch=5):
+        self.path = path
+        self.rate = float(rate)
+        self.batch = max(1, min(batch, int(self.rate) or 1))
+        self.local = 0
+        self.lock = asyncio.Lock()
+        open(self.path, 'ab').close()
+
+    def _take(self):
+        """Take up to batch tokens, returns (tokens taken, seconds to wait if none)"""
+        with open(self.path, 'r+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                raw = f.read(self.STATE.size)
+                tokens, last = self.STATE.unpack(raw) if len(raw) == self.STATE.size else (self.batch, now)
+                tokens = min(max(self.rate, self.batch), tokens + max(0.0, now - last) * self.rate)
+
+                taken = int(min(tokens, self.batch))
+                tokens -= taken
+                f.seek(0)
+                f.write(self.STATE.pack(tokens, now))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return taken, 0.0 if taken else (1 - tokens) / self.rate
+
+    async def acquire(self):
+        async with self.lock:
+            while self.local == 0:
+                taken, wait = await asyncio.to_thread(self._take)
+                self.local += taken
+                if not taken:
+                    await asyncio.sleep(wait)
+            self.local -= 1
+
+
+def merge_shards(results_folder, run_date, key=('omsid', 'storeID'), prefix='product'):
+    """Combine <prefix>-<date>.shard-*.csv into <prefix>-<date>.csv, keeping the last row per key"""
+    shard_files = sorted(glob.glob(os.path.join(results_folder, f'{prefix}-{run_date}.shard-*.csv')))
+    if not shard_files:
+        print(f"No shard outputs found for {run_date} in {results_folder}")
+        return None
+
+    output = os.path.join(results_folder, f'{prefix}-{run_date}.csv')
+    tmp_output = output + '.tmp'
+    rows = 0
+    with open(tmp_output, 'w', encoding='utf-8', newline='') as out:
+        writer = None
+        for shard_file in shard_files:
+            with open(shard_file, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if header is None:
+                    continue
+                if writer is None:
+                    writer = csv.writer(out)
+                    writer.writerow(header)
+                for row in reader:
+                    writer.writerow(row)
+                    rows += 1
+    os.replace(tmp_output, output)
+
+    print(f"Merged {len(shard_files)} shard files ({rows} rows) into {output}")
+    Utils.deduplicate_csv(output, subset=list(key))
+    return output
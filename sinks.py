@@ -0,0 +1,221 @@
+import csv, os
+
+
+"""
+Output sinks used by the result writer
+"""
+
+# Result fields as produced by LOWES.format_data
+RESULT_FIELDS = ['name', 'brand', 'url', 'mainImageurl', 'sku', 'reviews', 'rating', 'model', 'retailer', 'storesku', 'omsid', 'store_name', 'store_id', 'store_location', 'inventory']
+
+# CSV column names kept for compatibility with earlier output files
+CSV_HEADERS = ['name', 'brand', 'url', 'mainImageurl', 'SKU', 'Reviews', 'Rating', 'Model', 'retailer', 'storesku', 'omsid', 'storeName', 'storeID', 'storeLocation', 'inventory']
+
+
+class OutputSink():
+    """
+    Receives batches of result dicts, always called from the writer thread.
+    write_batch and close return the rows that are now on disk, so buffering
+    sinks don't get rows marked as done before they are written.
+    """
+
+    def open(self):
+        pass
+
+    def write_batch(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        return []
+
+
+class CSVSink(OutputSink):
+    def __init__(self, file_path, headers=CSV_HEADERS, fields=RESULT_FIELDS, mode='w'):
+        self.file_path = file_path
+        self.headers = headers
+        self.fields = fields
+        self.mode = mode
+        self.file = None
+        self.writer = None
+
+    def open(self):
+        write_header = self.mode == 'w' or not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == 0
+        self.file = open(self.file_path, self.mode, encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        if write_header:
+            self.writer.writerow(self.headers)
+            self.file.flush()
+
+    def write_batch(self, rows):
+        self.writer.writerows([row.get(f, '') for f in self.fields] for row in rows)
+        self.file.flush()
+        return rows
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        return []
+
+
+# Normalized layout: product fields once per product, a slim inventory row per store
+PRODUCT_FIELDS = ['name', 'brand', 'url', 'mainImageurl', 'sku', 'reviews', 'rating', 'model', 'retailer', 'storesku', 'omsid']
+PRODUCT_HEADERS = ['name', 'brand', 'url', 'mainImageurl', 'SKU', 'Reviews', 'Rating', 'Model', 'retailer', 'storesku', 'omsid']
+INVENTORY_FIELDS = ['omsid', 'store_id', 'inventory', 'timestamp']
+INVENTORY_HEADERS = ['omsid', 'storeID', 'qty', 'timestamp']
+
+
+class NormalizedCSVSink(OutputSink):
+    """
+    Writes products-<date>.csv with one row per product and inventory-<date>.csv
+    with (omsid, storeID, qty, timestamp) for every scanned pair.
+    """
+
+    def __init__(self, products_path, inventory_path, mode='w'):
+        self.products = CSVSink(products_path, headers=PRODUCT_HEADERS, fields=PRODUCT_FIELDS, mode=mode)
+        self.inventory = CSVSink(inventory_path, headers=INVENTORY_HEADERS, fields=INVENTORY_FIELDS, mode=mode)
+        self.seen = set()
+
+    def open(self):
+        # Products written before a restart are not written again
+        if self.products.mode == 'a' and os.path.exists(self.products.file_path):
+            with open(self.products.file_path, 'r', encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    self.seen.add(row.get('omsid'))
+        self.products.open()
+        self.inventory.open()
+
+    def write_batch(self, rows):
+        new_products = []
+        for row in rows:
+            if row.get('omsid') not in self.seen:
+                self.seen.add(row.get('omsid'))
+                new_products.append(row)
+        if new_products:
+            self.products.write_batch(new_products)
+        return self.inventory.write_batch(rows)
+
+    def close(self):
+        self.products.close()
+        return self.inventory.close()
+
+
+class ParquetSink(OutputSink):
+    """
+    Streams rows to Parquet files partitioned as run_date=<date>/store=<id>/part-<n>.parquet.
+    store_id stays a string column in the files: a store_id=<id> directory would be read back
+    as an integer by hive readers, turning '0004' into 4.
+    Rows are buffered per store and flushed as one file per row group. Files only count as
+    written once closed, so when memory runs short partial buffers go to small files, and
+    close() merges each store's files from this run into one with full row groups.
+    """
+    DICTIONARY_COLUMNS = ['store_id', 'store_name', 'store_location', 'brand', 'retailer']
+    INT_COLUMNS = ['reviews', 'inventory']
+    FLOAT_COLUMNS = ['rating']
+
+    def __init__(self, root_dir, run_date, row_group_size=10000, max_buffered_rows=200000, compression='zstd'):
+        self.root_dir = root_dir
+        self.run_date = run_date
+        self.row_group_size = row_group_size
+        self.max_buffered_rows = max_buffered_rows
+        self.compression = compression
+        self.columns = list(RESULT_FIELDS)
+        self.buffers = {}
+        self.files = {}  # store_id -> part files written by this sink
+        self.buffered = 0
+        self.parts = 0
+        self.pa = None
+        self.pq = None
+        self.schema = None
+
+    def open(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError('pyarrow is required for parquet output (pip install pyarrow)')
+        self.pa, self.pq = pa, pq
+
+        types = {c: pa.int64() for c in self.INT_COLUMNS}
+        types.update({c: pa.float64() for c in self.FLOAT_COLUMNS})
+        self.schema = pa.schema([(c, types.get(c, pa.string())) for c in self.columns])
+        os.makedirs(os.path.join(self.root_dir, f'run_date={self.run_date}'), exist_ok=True)
+
+    def _value(self, column, value):
+        if value is None or value == '':
+            return None
+        try:
+            if column in self.INT_COLUMNS:
+                return int(value)
+            if column in self.FLOAT_COLUMNS:
+                return float(value)
+        except (TypeError, ValueError):
+            return None
+        return str(value)
+
+    def _flush_store(self, store_id):
+        rows = self.buffers.pop(store_id, [])
+        if not rows:
+            return rows
+        self.buffered -= len(rows)
+
+        arrays = {c: [self._value(c, row.get(c)) for row in rows] for c in self.columns}
+        table = self.pa.Table.from_pydict(arrays, schema=self.schema)
+
+        path = self._part_path(store_id)
+        self._write(table, path)
+        self.files.setdefault(store_id, []).append(path)
+        return rows
+
+    def _part_path(self, store_id):
+        folder = os.path.join(self.root_dir, f'run_date={self.run_date}', f'store={store_id}')
+        os.makedirs(folder, exist_ok=True)
+        self.parts += 1
+        return os.path.join(folder, f'part-{os.getpid()}-{self.parts:06d}.parquet')
+
+    def _write(self, table, path):
+        self.pq.write_table(
+            table,
+            path,
+            row_group_size=self.row_group_size,
+            use_dictionary=self.DICTIONARY_COLUMNS,
+            compression=self.compression,
+        )
+
+    def _compact(self, store_id):
+        """Merge the store's part files into one; the parts stay until the merged file is in place"""
+        files = self.files.pop(store_id, [])
+        if len(files) < 2:
+            return
+        table = self.pa.concat_tables([self.pq.read_table(path, schema=self.schema) for path in files])
+        path = self._part_path(store_id)
+        # Dot-prefixed files are ignored by dataset readers until renamed
+        temp_path = os.path.join(os.path.dirname(path), '.' + os.path.basename(path))
+        self._write(table, temp_path)
+        os.replace(temp_path, path)
+        for part in files:
+            os.remove(part)
+
+    def write_batch(self, rows):
+        durable = []
+        for row in rows:
+            store_id = str(row.get('store_id') or 'unknown')
+            self.buffers.setdefault(store_id, []).append(row)
+            self.buffered += 1
+            if len(self.buffers[store_id]) >= self.row_group_size:
+                durable.extend(self._flush_store(store_id))
+
+        # Keep memory bounded when many stores are partially filled
+        if self.buffered >= self.max_buffered_rows:
+            for store_id in list(self.buffers):
+                durable.extend(self._flush_store(store_id))
+        return durable
+
+    def close(self):
+        durable = []
+        for store_id in list(self.buffers):
+            durable.extend(self._flush_store(store_id))
+        # Rows are already on disk, merging only rewrites them into fewer files
+        for store_id in list(self.files):
+            self._compact(store_id)
+        return durable
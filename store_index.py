@@ -0,0 +1,144 @@
+import math, os, pickle
+from lowes import read_stores
+
+
+"""
+Precompiled store index: lookups by state/region/area and a grid index over store coordinates.
+The compiled index is cached as a pickle and rebuilt only when store_ids.json changes.
+"""
+
+SNAPSHOT_VERSION = 1
+EARTH_RADIUS_MILES = 3958.8
+CELL_DEGREES = 1.0
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+
+def _cell(lat, lon):
+    return (math.floor(lat / CELL_DEGREES), math.floor(lon / CELL_DEGREES))
+
+
+class StoreIndex():
+    def __init__(self, stores, regions, areas, coords, total):
+        self.stores = stores
+        self.regions = regions
+        self.areas = areas
+        self.coords = coords
+        self.total = total
+
+        self.by_state = {}
+        self.by_region = {}
+        self.by_area = {}
+        self.by_zip = {}
+        self.grid = {}
+        for i, store in enumerate(stores):
+            self.by_state.setdefault(store.state.upper(), []).append(i)
+            self.by_region.setdefault(regions[i], []).append(i)
+            self.by_area.setdefault(areas[i], []).append(i)
+            if coords[i] is not None:
+                self.by_zip.setdefault(store.zipcode[:5], coords[i])
+                self.grid.setdefault(_cell(*coords[i]), []).append(i)
+
+    @classmethod
+    def build(cls, stores_file):
+        # Same loader and zipcode validation as LOWES.iter_stores
+        stats = {'total': 0, 'invalid': 0}
+        stores, regions, areas, coords = [], [], [], []
+        for store, region, area, point in read_stores(stores_file, stats=stats):
+            stores.append(store)
+            regions.append(region)
+            areas.append(area)
+            coords.append(point)
+        return cls(stores, regions, areas, coords, total=stats['total'])
+
+    @classmethod
+    def load(cls, root_dir, stores_file='store_ids.json'):
+        """Load the cached snapshot, rebuilding it when the JSON's mtime or size changed"""
+        source = os.path.join(root_dir, stores_file)
+        stat = os.stat(source)
+        signature = (SNAPSHOT_VERSION, stat.st_mtime_ns, stat.st_size)
+        snapshot = os.path.join(root_dir, '.cache', 'store_index.pkl')
+
+        try:
+            with open(snapshot, 'rb') as f:
+                cached_signature, index = pickle.load(f)
+            if cached_signature == signature:
+                return index
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            pass
+
+        index = cls.build(source)
+        os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+        tmp = snapshot + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump((signature, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, snapshot)
+        return index
+
+    def __getstate__(self):
+        # Lookup tables are cheap to rebuild, only the records are stored
+        return {'stores': self.stores, 'regions': self.regions, 'areas': self.areas, 'coords': self.coords, 'total': self.total}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def strata(self, by='state'):
+        """store_id -> stratum (state, or region number) for every valid store"""
+        if by == 'region':
+            return {store.store_id: self.regions[i] for i, store in enumerate(self.stores)}
+        return {store.store_id: store.state.upper() for store in self.stores}
+
+    def locate_zip(self, zipcode):
+        """Coordinates for a zip code: a store in that zip, else the centroid of its 3-digit prefix"""
+        zipcode = str(zipcode).strip()[:5]
+        if zipcode in self.by_zip:
+            return self.by_zip[zipcode]
+        nearby = [coords for z, coords in self.by_zip.items() if z[:3] == zipcode[:3]]
+        if not nearby:
+            raise ValueError(f'No stores found near zip code {zipcode}, pass coordinates instead')
+        return (sum(c[0] for c in nearby) / len(nearby), sum(c[1] for c in nearby) / len(nearby))
+
+    def within(self, lat, lon, radius_miles):
+        """Indices of stores within radius_miles of (lat, lon), nearest first"""
+        lat_span = radius_miles / 69.0
+        lon_span = radius_miles / max(69.0 * math.cos(math.radians(lat)), 1e-6)
+        min_cell = _cell(lat - lat_span, lon - lon_span)
+        max_cell = _cell(lat + lat_span, lon + lon_span)
+
+        found = []
+        for cell_lat in range(min_cell[0], max_cell[0] + 1):
+            for cell_lon in range(min_cell[1], max_cell[1] + 1):
+                for i in self.grid.get((cell_lat, cell_lon), ()):
+                    distance = haversine_miles(lat, lon, *self.coords[i])
+                    if distance <= radius_miles:
+                        found.append((distance, i))
+        return [i for _, i in sorted(found)]
+
+    def select(self, states=None, regions=None, areas=None, near=None, near_zip=None, radius_miles=None):
+        """Stores matching every given filter; no filters returns all valid stores"""
+        selected = None
+
+        def narrow(indices):
+            nonlocal selected
+            indices = set(indices)
+            selected = indices if selected is None else selected & indices
+
+        if states:
+            narrow(i for state in states for i in self.by_state.get(state.upper(), ()))
+        if regions:
+            narrow(i for region in regions for i in self.by_region.get(str(region), ()))
+        if areas:
+            narrow(i for area in areas for i in self.by_area.get(str(area), ()))
+        if near is not None or near_zip:
+            if not radius_miles:
+                raise ValueError('A radius is required for a location filter')
+            lat, lon = near if near is not None else self.locate_zip(near_zip)
+            narrow(self.within(lat, lon, radius_miles))
+
+        if selected is None:
+            return list(self.stores)
+        return [self.stores[i] for i in sorted(selected)]
@@ -0,0 +1,145 @@
+import asyncio, random, time
+import jsonlog
+
+
+"""
+Shared token pool used by all workers
+"""
+
+log = jsonlog.get_logger(__name__)
+
+class Token():
+    def __init__(self, value, headers, validity):
+        self.value = value
+        self.headers = headers
+        self.headers['authorization'] = f'Bearer {value}'
+        self.issued_at = time.monotonic()
+        self.expires_at = self.issued_at + validity
+        self.uses = 0
+        self.valid = True
+
+    def expired(self, now=None):
+        return (now or time.monotonic()) >= self.expires_at
+
+
+class TokenBroker():
+    def __init__(self, lowes, pool_size=5, validity_minutes=15, refresh_margin=60, max_uses=None, timeout=30, max_failures=8):
+        self.lowes = lowes
+        self.pool_size = pool_size
+        self.validity = validity_minutes * 60
+        self.refresh_margin = refresh_margin
+        self.max_uses = max_uses
+        self.timeout = timeout
+        # Consecutive failed refresh rounds with an empty pool before acquire() gives up
+        self.max_failures = max_failures
+
+        self.tokens = []
+        self.refresh_at = {}
+        self.refresh_event = asyncio.Event()
+        self.available = asyncio.Condition()
+        self.refresher = None
+        self.closed = False
+        self.error = None
+
+    async def start(self):
+        # Fill the pool before any worker asks for a token
+        await asyncio.gather(*(self._fetch(i) for i in range(self.pool_size)))
+        self.refresher = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        self.closed = True
+        if self.refresher is not None:
+            self.refresher.cancel()
+            await asyncio.gather(self.refresher, return_exceptions=True)
+
+    async def acquire(self):
+        """Hand out the least used valid token, waiting for a refresh if the pool is empty"""
+        async with self.available:
+            while True:
+                now = time.monotonic()
+                tokens = [t for t in self.tokens if t.valid and not t.expired(now)]
+                if tokens:
+                    token = min(tokens, key=lambda t: t.uses)
+                    token.uses += 1
+                    if self.max_uses is not None and token.uses >= self.max_uses:
+                        self._retire(token)
+                    return token
+                if self.error is not None:
+                    raise self.error
+                if self.closed:
+                    raise RuntimeError('Token broker is closed')
+                self.refresh_event.set()
+                await self.available.wait()
+
+    def invalidate(self, token):
+        """Drop a single token (e.g. after a 401) and ask the refresher for a replacement"""
+        if token is not None and token.valid:
+            self._retire(token)
+
+    def _retire(self, token):
+        token.valid = False
+        if token in self.tokens:
+            self.tokens.remove(token)
+        self.refresh_event.set()
+
+    def _deadline(self, token):
+        # Jitter the refresh point so tokens issued together don't all renew at once
+        return token.expires_at - self.refresh_margin - random.uniform(0, self.refresh_margin)
+
+    async def _fetch(self, slot):
+        headers = self.lowes.build_token_headers()
+        started = time.monotonic()
+        success, value, _ = await self.lowes.get_token_async(headers, slot, delay=0, timeout=self.timeout)
+        self.lowes.metrics.token_refresh.observe(time.monotonic() - started)
+        if not success:
+            log.warning('Token broker: failed to get token for slot %s: %s', slot, value)
+            return None
+
+        token = Token(value, headers, self.validity)
+        async with self.available:
+            self.tokens.append(token)
+            self.refresh_at[token] = self._deadline(token)
+            self.available.notify_all()
+        return token
+
+    async def _refresh_loop(self):
+        failures = 0
+        while not self.closed:
+            # Cleared before counting, so an invalidate() during the fetch below wakes the next round
+            self.refresh_event.clear()
+            now = time.monotonic()
+
+            # Drop hard-expired tokens, replace the ones close to expiry
+            for token in [t for t in self.tokens if t.expired(now)]:
+                self._retire(token)
+            self.refresh_at = {t: at for t, at in self.refresh_at.items() if t.valid}
+
+            due = [t for t, at in self.refresh_at.items() if at <= now]
+            missing = self.pool_size - (len(self.tokens) - len(due))
+
+            if missing > 0:
+                results = await asyncio.gather(*(self._fetch(i) for i in range(missing)))
+                fetched = [t for t in results if t is not None]
+                # Only retire stale tokens once their replacements are in the pool
+                for token in due[:len(fetched)]:
+                    self.refresh_at.pop(token, None)
+                    self._retire(token)
+                failures = 0 if len(fetched) == missing else failures + 1
+
+            if failures >= self.max_failures and not self.tokens:
+                # The token endpoint keeps failing: fail waiting workers instead of blocking the run forever
+                self.error = RuntimeError(f'Token broker: no token after {failures} refresh attempts')
+                log.error('%s', self.error)
+                async with self.available:
+                    self.available.notify_all()
+                return
+
+            if failures:
+                await asyncio.sleep(min(2 ** failures, 30))
+                continue
+
+            next_at = min(self.refresh_at.values(), default=now + self.refresh_margin)
+            try:
+                await asyncio.wait_for(self.refresh_event.wait(), timeout=max(next_at - time.monotonic(), 0.1))
+            except asyncio.TimeoutError:
+                pass
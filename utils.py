@@ -1,11 +1,11 @@
-import os, json, random, string, time,pandas as pd
-from datetime import datetime
+import os, json, random, string, time, csv, struct, tempfile, logging, hashlib
+import jsonlog
 
 
 
 
 root_dir = os.path.dirname(__file__)
-logs_file = os.path.join(root_dir,'logs.txt')
+logs_file = os.path.join(root_dir,'logs.jsonl')
 
 class Utils:
     @staticmethod
@@ -15,17 +15,19 @@ class Utils:
             yield l[i:i + n]
             
     @staticmethod
-    def write_log(message, log_file_path=logs_file):
-        current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        with open(log_file_path, 'a') as log_file:
-            log_file.write(f"[{current_datetime}] [LOG] {message}\n")
-        # print(f"[{current_datetime}] [LOG] {message}\n")
+    def write_log(message, log_file_path=logs_file, level='info'):
+        # Handed to the background JSON-lines writer, the caller never touches the file
+        if not jsonlog.configured():
+            jsonlog.setup_logging(log_file_path)
+        jsonlog.get_logger('utils').log(logging.getLevelName(level.upper()), str(message))
 
     @staticmethod
     def load_proxies():
         proxies = []
         file = os.path.join(root_dir,'proxies.txt')
+        # No proxies.txt means direct connections
+        if not os.path.exists(file):
+            return proxies
         with open(file,"r") as f:
             for proxy in f.readlines():
                 proxy = proxy.replace("\n","").split(":")
@@ -63,6 +65,16 @@ class Utils:
     @staticmethod
     def get_retries_count():return 3
 
+    @staticmethod
+    def valid_omsid(omsid):
+        # Strict OMSID validation - it is used for the API calls
+        return bool(omsid) and omsid.lower() not in ['null', 'none', 'n/a', 'na'] and omsid != '0'
+
+    @staticmethod
+    def valid_zipcode(zipcode):
+        # Some zipcodes in the store list are incorrect
+        return bool(zipcode) and len(zipcode) >= 5 and zipcode.isdigit() and zipcode != '0'
+
     @staticmethod
     def safe_get(dictionary:dict, *keys, default=[]):
         for key in keys:
@@ -77,20 +89,85 @@ class Utils:
 
 
     @staticmethod
-    def deduplicate_csv(file_path='homedepot_products.csv', subset=['SKU']):
+    def _load_spilled_bucket(path, record):
+        # Later records of a key have larger row indices, so the last one wins
+        bucket = {}
+        with open(path, 'rb') as f:
+            for key, index in record.iter_unpack(f.read()):
+                bucket[key] = index
+        return bucket
+
+    @staticmethod
+    def deduplicate_csv(file_path='homedepot_products.csv', subset=['SKU'], max_keys=2000000, buckets=64):
         """
         Remove duplicate rows from CSV by key columns, keeping the latest record.
+        The file is streamed twice: the first pass finds the last row of every key, holding
+        only a key digest -> row index map (spilled to bucket files past max_keys), the second
+        copies the kept rows to a temp file that replaces the original.
         """
         try:
-            df = pd.read_csv(file_path)
-            before = len(df)
-
-            # Keep the last (latest) entry for each unique key
-            df = df.drop_duplicates(subset=subset, keep='last')
-
-            df.to_csv(file_path, index=False)
-            after = len(df)
-            print(f"✅ Deduplicated {file_path}: {before - after} duplicates removed, {after} rows remaining (latest kept).")
+            record = struct.Struct('<16sQ')  # key digest, row index
+            last_row = {}
+            spill_dir = None
+            spill_files = []
+            rows = 0
+
+            with open(file_path, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.reader(f)
+                header = next(reader, None)
+                if header is None:
+                    return
+                columns = [header.index(column) for column in subset]
+
+                for row in reader:
+                    if not row:
+                        continue
+                    # 128-bit digest: a collision would silently drop a distinct row, so hash() is too narrow
+                    key = hashlib.blake2b('\0'.join(row[c] if c < len(row) else '' for c in columns).encode('utf-8'), digest_size=16).digest()
+                    if spill_dir is None:
+                        last_row[key] = rows
+                        if len(last_row) > max_keys:
+                            # Index too large for memory, move it to hash buckets on disk
+                            spill_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(file_path)))
+                            spill_files = [open(os.path.join(spill_dir.name, f'{i}.bin'), 'wb') for i in range(buckets)]
+                            for spilled_key, index in last_row.items():
+                                spill_files[int.from_bytes(spilled_key[:4], 'little') % buckets].write(record.pack(spilled_key, index))
+                            last_row = {}
+                    else:
+                        spill_files[int.from_bytes(key[:4], 'little') % buckets].write(record.pack(key, rows))
+                    rows += 1
+
+            # One bit per row marks the rows that are kept
+            keep = bytearray((rows + 7) // 8)
+            if spill_dir is None:
+                buckets_kept = [last_row]
+            else:
+                for spill_file in spill_files:
+                    spill_file.close()
+                buckets_kept = (Utils._load_spilled_bucket(spill_file.name, record) for spill_file in spill_files)
+            after = 0
+            for bucket in buckets_kept:
+                for index in bucket.values():
+                    keep[index >> 3] |= 1 << (index & 7)
+                after += len(bucket)
+            if spill_dir is not None:
+                spill_dir.cleanup()
+
+            tmp_path = file_path + '.tmp'
+            with open(file_path, 'r', encoding='utf-8', newline='') as src, open(tmp_path, 'w', encoding='utf-8', newline='') as dst:
+                reader = csv.reader(src)
+                writer = csv.writer(dst)
+                writer.writerow(next(reader))
+                index = 0
+                for row in reader:
+                    if not row:
+                        continue
+                    if keep[index >> 3] & (1 << (index & 7)):
+                        writer.writerow(row)
+                    index += 1
+            os.replace(tmp_path, file_path)
+
+            print(f"✅ Deduplicated {file_path}: {rows - after} duplicates removed, {after} rows remaining (latest kept).")
 
         except Exception as e:
-            print(f"⚠️ Could not deduplicate {file_path}: {e}")
\ No newline at end of file
+            print(f"⚠️ Could not deduplicate {file_path}: {e}")
@@ -0,0 +1,192 @@
+import csv, glob, heapq, os, re, sqlite3
+
+
+"""
+Inventory volatility tracking for incremental runs.
+Previous result files are folded into a per-pair history (last quantity, runs observed,
+number of changes) and each pair is rescanned once it has probably changed since its last scan.
+"""
+
+RESULT_FILE = re.compile(r'^(product|inventory)-(\d{4}-\d{2}-\d{2})\.csv$')
+
+# Quantity column in the wide and normalized outputs
+QTY_COLUMNS = ('inventory', 'qty')
+
+
+def result_files(results_folder, before):
+    """One output file per run date before `before`, the wide CSV preferred over the normalized inventory"""
+    files = {}
+    for path in glob.glob(os.path.join(results_folder, '*.csv')):
+        match = RESULT_FILE.match(os.path.basename(path))
+        if match and match.group(2) < before:
+            if match.group(1) == 'product' or match.group(2) not in files:
+                files[match.group(2)] = path
+    return sorted(files.items())
+
+
+def history_rows(db_path, run_date):
+    """(omsid, store_id, qty) of every pair as last scanned before run_date, sorted by pair"""
+    conn = sqlite3.connect(db_path)
+    try:
+        last_index = conn.execute('SELECT MAX(run_index) FROM runs WHERE run_date < ?', (run_date,)).fetchone()[0] or 0
+        # The primary key order, which matches Python's string order for UTF-8 text
+        rows = conn.execute('SELECT omsid, store_id, qty FROM pairs WHERE last_run <= ? ORDER BY omsid, store_id', (last_index,))
+        for omsid, store_id, qty in rows:
+            yield omsid, store_id, qty if qty is not None else ''
+    finally:
+        conn.close()
+
+
+class VolatilityTracker():
+    def __init__(self, db_path, max_interval=7, threshold=0.5, batch_size=10000):
+        self.db_path = db_path
+        self.max_interval = max_interval
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.current_run = 1
+        # Set by fit_budget: (probability bin, rank of the last due pair in that bin)
+        self.cutoff = None
+        self.bins = 100
+
+        # Shard processes ingest the same files, the write lock makes them take turns
+        self.conn = sqlite3.connect(db_path, timeout=300, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS pairs (
+                omsid TEXT NOT NULL,
+                store_id TEXT NOT NULL,
+                qty TEXT,
+                first_run INTEGER NOT NULL,
+                last_run INTEGER NOT NULL,
+                changes INTEGER NOT NULL,
+                PRIMARY KEY (omsid, store_id)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS runs (run_date TEXT PRIMARY KEY, run_index INTEGER NOT NULL)')
+
+    def _ingest_file(self, path, run_index):
+        upsert = '''
+            INSERT INTO pairs (omsid, store_id, qty, first_run, last_run, changes) VALUES (?, ?, ?, ?, ?, 0)
+            ON CONFLICT (omsid, store_id) DO UPDATE SET
+                changes = changes + (qty IS NOT excluded.qty AND last_run < excluded.last_run),
+                qty = excluded.qty,
+                last_run = excluded.last_run
+        '''
+        rows = 0
+        batch = []
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            qty_column = next((c for c in QTY_COLUMNS if c in (reader.fieldnames or [])), None)
+            if qty_column is None:
+                return 0
+            for row in reader:
+                batch.append((row.get('omsid', ''), row.get('storeID', ''), row.get(qty_column), run_index, run_index))
+                if len(batch) >= self.batch_size:
+                    self.conn.executemany(upsert, batch)
+                    rows += len(batch)
+                    batch = []
+        if batch:
+            self.conn.executemany(upsert, batch)
+            rows += len(batch)
+        return rows
+
+    def ingest(self, results_folder, run_date):
+        """Fold result files of runs before run_date into the history, each date once"""
+        ingested = []
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            known = dict(self.conn.execute('SELECT run_date, run_index FROM runs').fetchall())
+            last_index = max(known.values(), default=0)
+            for date, path in result_files(results_folder, run_date):
+                if date in known:
+                    continue
+                last_index += 1
+                rows = self._ingest_file(path, last_index)
+                self.conn.execute('INSERT INTO runs (run_date, run_index) VALUES (?, ?)', (date, last_index))
+                ingested.append((date, rows))
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+
+        # Runs at or after run_date (a rerun of the same day) don't count as history
+        row = self.conn.execute('SELECT MAX(run_index) FROM runs WHERE run_date < ?', (run_date,)).fetchone()
+        self.current_run = (row[0] or 0) + 1
+        return ingested
+
+    def change_probability(self, first_run, last_run, changes):
+        """Chance the pair changed since its last scan, from its per-run change rate"""
+        since = self.current_run - last_run
+        if since >= self.max_interval:
+            return 1.0
+        # Laplace-smoothed rate: a pair seen once starts at 0.5 per run
+        rate = (changes + 1) / (last_run - first_run + 2)
+        return 1 - (1 - rate) ** since
+
+    def rank(self, omsid, store_id, first_run, last_run, changes):
+        """Most likely changed first, then longest unscanned; the pair breaks ties the same way in every shard"""
+        return (self.change_probability(first_run, last_run, changes), self.current_run - last_run, omsid, store_id)
+
+    def fit_budget(self, budget, total_pairs, bins=100):
+        """Set the cutoff so exactly `budget` of total_pairs are due this run, or all of them if fewer"""
+        counts = [0] * (bins + 1)
+        tracked = 0
+        for first_run, last_run, changes in self.conn.execute('SELECT first_run, last_run, changes FROM pairs'):
+            counts[int(self.change_probability(first_run, last_run, changes) * bins)] += 1
+            tracked += 1
+
+        # Pairs without history are always scanned
+        capacity = budget - max(total_pairs - tracked, 0)
+        due = 0
+        boundary = None
+        for index in range(bins, -1, -1):
+            if due + counts[index] > capacity:
+                boundary = index
+                break
+            due += counts[index]
+        self.bins = bins
+        if boundary is None:
+            # The budget covers every pair
+            self.threshold = 0.0
+            self.cutoff = None
+            return due
+
+        # Bins above the boundary are due as a whole, the boundary bin is filled pair by pair by rank
+        need = capacity - due
+        last = None
+        if need > 0:
+            rows = self.conn.execute('SELECT omsid, store_id, first_run, last_run, changes FROM pairs')
+            ranks = (self.rank(*row) for row in rows if int(self.change_probability(*row[2:]) * bins) == boundary)
+            last = heapq.nlargest(need, ranks)[-1]
+            due += need
+        self.threshold = boundary / bins
+        self.cutoff = (boundary, last)
+        return due
+
+    def due(self, omsid, store_id, first_run, last_run, changes):
+        probability = self.change_probability(first_run, last_run, changes)
+        if self.cutoff is None:
+            return probability >= self.threshold
+        boundary, last = self.cutoff
+        index = int(probability * self.bins)
+        if index != boundary:
+            return index > boundary
+        return last is not None and self.rank(omsid, store_id, first_run, last_run, changes) >= last
+
+    def stable_stores(self, omsid):
+        """Store ids whose inventory for this product is unlikely to have changed, looked up per product"""
+        omsid = str(omsid)
+        rows = self.conn.execute('SELECT store_id, first_run, last_run, changes FROM pairs WHERE omsid = ?', (omsid,))
+        return {store_id for store_id, first_run, last_run, changes in rows
+                if not self.due(omsid, store_id, first_run, last_run, changes)}
+
+    def summary(self):
+        pairs, volatile = self.conn.execute(
+            'SELECT COUNT(*), SUM(changes > 0) FROM pairs'
+        ).fetchone()
+        return (f"Volatility: {pairs or 0} pairs tracked ({volatile or 0} changed at least once), "
+                f"run {self.current_run}, threshold {self.threshold:.2f}, max interval {self.max_interval} runs")
+
+    def close(self):
+        self.conn.close()
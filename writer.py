@@ -0,0 +1,89 @@
+import asyncio, time
+
+
+"""
+Queue-fed result writer: workers enqueue rows, one task writes them in batches
+"""
+
+class WriterError(RuntimeError):
+    """Raised to producers once the sink has failed, the rows are not written"""
+
+class ResultWriter():
+    def __init__(self, sink, batch_size=500, flush_interval=2.0, max_queue=10000, on_flush=None):
+        self.sink = sink
+        # Called with the keys of each batch once it has been written
+        self.on_flush = on_flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # Bounded so producers slow down when the disk falls behind
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.rows_written = 0
+        self.batches_written = 0
+        self.pending_keys = {}
+        self.task = None
+        self.error = None
+
+    async def start(self):
+        await asyncio.to_thread(self.sink.open)
+        self.task = asyncio.create_task(self._run())
+
+    async def put(self, row, key=None):
+        # Only waits when the queue is full (backpressure), never on file I/O
+        if self.error is not None:
+            raise WriterError(f'Result writer failed: {self.error}') from self.error
+        await self.queue.put((row, key))
+
+    async def close(self):
+        if self.task is not None:
+            if self.error is None:
+                await self.queue.put(None)
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        durable = await asyncio.to_thread(self.sink.close)
+        self._notify(durable)
+
+    def _notify(self, durable):
+        # Sinks may buffer, so only report keys of rows they say are on disk
+        if self.on_flush is None or not durable:
+            return
+        keys = [self.pending_keys.pop(id(row)) for row in durable if id(row) in self.pending_keys]
+        if keys:
+            self.on_flush(keys)
+
+    async def _run(self):
+        done = False
+        while not done:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+
+            # Collect until the batch is full or the flush interval elapses
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+
+            if self.on_flush is not None:
+                self.pending_keys.update((id(row), key) for row, key in batch if key is not None)
+            try:
+                durable = await asyncio.to_thread(self.sink.write_batch, [row for row, _ in batch])
+            except Exception as e:
+                # Unblock producers waiting on a full queue, their next put() raises
+                self.error = e
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                raise
+            self._notify(durable)
+            self.rows_written += len(batch)
+            self.batches_written += 1